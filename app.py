@@ -22,7 +22,11 @@
 #
 
 from quart import Quart  # , request
+from src.controllers import post_controllers, analytics_controllers, reaction_controllers
+from src.utils.id_allocator import ids
 import blueprints
+import asyncio
+import config
 import gc
 
 gc.enable()
@@ -38,6 +42,50 @@ for blueprint in blueprints.__all__:
         app.register_blueprint(app_api)
 
 
+async def _refresh_post_id_filter():
+    while True:
+        await asyncio.sleep(config.POST_ID_FILTER_REFRESH)
+        try:
+            await post_controllers.build_post_id_filter()
+        except Exception:
+            # The previous filter is kept, and the rebuild is retried on the next round
+            app.logger.exception('Failed to refresh the post ID filter')
+
+
+@app.before_serving
+async def build_post_id_filter():
+    if config.USE_POST_ID_FILTER:
+        await post_controllers.build_post_id_filter()
+        asyncio.ensure_future(_refresh_post_id_filter())
+
+
+@app.before_serving
+async def reserve_worker_id():
+    # A random worker ID may be the same of another worker, which would issue the same IDs: if none can be reserved,
+    # the worker does not start
+    ids.worker_id = await analytics_controllers.reserve_worker_id(ids.WORKER_BITS)
+
+
+@app.before_serving
+async def start_analytics_flusher():
+    asyncio.ensure_future(analytics_controllers.run_flusher())
+
+
+@app.after_serving
+async def flush_analytics():
+    await analytics_controllers.flush()
+
+
+@app.before_serving
+async def start_reaction_flusher():
+    asyncio.ensure_future(reaction_controllers.run_reaction_flusher())
+
+
+@app.after_serving
+async def flush_reactions():
+    await reaction_controllers.flush_reactions()
+
+
 @app.route('/')
 async def hello_world():
     return ''
@@ -25,5 +25,6 @@ from .channels_handler import channels_api
 from .users_handler import users_api
 from .posts_handler import posts_api
 from .reactions_handler import reactions_api
+from .comments_handler import comments_api
 
-__all__ = ['channels_api', 'users_api', 'posts_api', 'reactions_api']
+__all__ = ['channels_api', 'users_api', 'posts_api', 'reactions_api', 'comments_api']
@@ -215,12 +215,13 @@ async def get_channel(channel_id: int)-> Response:
         return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
     # noinspection PyBroadException
     try:
-        channel = await channel_controllers.get_channels(channel_id=int(channel_id))
+        channel = await channel_controllers.get_channel_fields(int(channel_id),
+                                                               ('chid', 'title', 'description', 'photo_id'))
         data = {
-            'channel_id': channel.chid,
-            'title': channel.title,
-            'description': channel.description,
-            'profile_photo': channel.photo_id
+            'channel_id': channel['chid'],
+            'title': channel['title'],
+            'description': channel['description'],
+            'profile_photo': channel['photo_id']
         }
         return_data = await api_response(success=True, op=get_channel.__name__, msg=None, channel=data)
         return Response(return_data, status=200, mimetype='application/json', content_type='application/json', )
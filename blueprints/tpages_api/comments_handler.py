@@ -0,0 +1,263 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+from quart import Blueprint, request, Response
+from src.controllers import comment_controllers, post_controllers
+from .api_utils import app_auth_required, error_response, request_limit, user_auth_required
+from src.utils.json_handlers import api_request, api_response
+from src.models.config import MAX_REPLY_COMMENTS, MAX_REPLIES_PER_COMMENT
+import traceback
+
+comments_api = Blueprint('comments', __name__, static_folder='./static', static_url_path='/static/files',
+                         template_folder='./templates', subdomain='api')
+
+
+def comment_data(document: dict)-> dict:
+    """
+    Converts a raw comment document to the format returned by the API.
+    :param document: The raw comment document
+    :return: Dict of the comment
+    """
+    rank = document.get('rank', None) or {}
+    return {
+        'comment_id': document.get('commentId'),
+        'user_id': document.get('userId'),
+        'post_id': document.get('postReference'),
+        'comment': document.get('comment'),
+        'created_date': document.get('createdDate'),
+        'rank': {'up': rank.get('upCount', 0), 'down': rank.get('downCount', 0)},
+        'rank_position': document.get('rankPosition', 0.0),
+        'reply_count': document.get('replyCount', 0),
+    }
+
+
+def reply_data(document: dict)-> dict:
+    """
+    Converts a raw reply document to the format returned by the API.
+    :param document: The raw reply document
+    :return: Dict of the reply
+    """
+    return {
+        'comment_id': document.get('commentId'),
+        'user_id': document.get('userId'),
+        'post_id': document.get('postReference'),
+        'reply_to': document.get('replyTo'),
+        'comment': document.get('comment'),
+        'created_date': document.get('createdDate'),
+    }
+
+
+@comments_api.route('/comments/post/<string:post_id>/', methods=('GET', ))
+@comments_api.route('/comments/post/', methods=('GET',), defaults={'post_id': None})
+@app_auth_required
+@user_auth_required
+@request_limit(50, 10)
+async def get_post_comments(post_id: str)-> Response:
+    """
+    Gets the comments of a post, best ranked first, one page at a time. Replies are not included.
+    :param post_id: The post unique identifier on the database
+
+    The request can also contain additional arguments, `limit` and `cursor`.
+    |arg limit: Limits the quantity of comments in the page. Defaults to 30, maximum is 100
+    |arg cursor: The `next_cursor` returned with the previous page. Omit it to get the first page
+
+    :return: JSON serialized Response
+
+             Possible Responses:
+             200 - OK, with response:
+             {
+                 "success": True,
+                 "op": "get_post_comments",
+                 "comments": [
+                     {
+                        "comment_id": str,
+                        "user_id": int,
+                        "post_id": str,
+                        "comment": str,
+                        "created_date": datetime,
+                        "rank": {
+                            "up": int,
+                            "down": int
+                        },
+                        "rank_position": float,
+                        "reply_count": int
+                     },
+                     ...
+                 ],
+                 "qty": int,
+                 "next_cursor": str, or null if this is the last page
+             }
+
+             400 - Bad Request:
+             {
+                 "success": False,
+                 "op": "get_post_comments",
+                 "msg": "{reason}"
+             }
+
+             401 - Unauthorized:
+             {
+                 "success": False,
+                 "op": "get_post_comments",
+                 "msg": "{reason}"
+             }
+
+             404 - Not Found:
+             {
+                "success": False,
+                "op": "get_post_comments",
+                "msg": "{reason}"
+             }
+
+             500 - Server Error:
+             {
+                 "success": False,
+                 "op": "get_post_comments",
+                 "msg": "Internal Server Error",
+                 "stack_trace": str (Python stacktrace)
+             }
+    """
+    if post_id is None:
+        return_data = await api_response(success=False, op=get_post_comments.__name__, msg='Malformed request data.',
+                                         error='#MALFORMED_REQUEST')
+        return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
+
+    # noinspection PyBroadException
+    try:
+        limit = min(max(int(request.args.get('limit', 30)), 1), 100)
+        cursor = request.args.get('cursor', None)
+        post = await post_controllers.get_post_document(post_id)
+        documents, next_cursor = await comment_controllers.get_comment_documents(post['_id'], cursor=cursor,
+                                                                                 limit=limit)
+        data = [comment_data(document) for document in documents]
+        return_data = await api_response(success=True, op=get_post_comments.__name__, msg=None, comments=data,
+                                         qty=len(data), next_cursor=next_cursor)
+        return Response(return_data, status=200, mimetype='application/json', content_type='application/json', )
+    except ValueError:
+        return_data = await api_response(success=False, op=get_post_comments.__name__, msg='Malformed request data.',
+                                         error='#MALFORMED_REQUEST')
+        return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
+    except post_controllers.PostModel.DoesNotExist:
+        return_data = await api_response(success=False, op=get_post_comments.__name__, msg="Post doesn't exist.",
+                                         error='#POST_NOT_FOUND')
+        return Response(return_data, status=404, mimetype='application/json', content_type='application/json', )
+    except Exception:
+        return await error_response(get_post_comments.__name__, traceback.format_exc())
+
+
+@comments_api.route('/comments/replies/', methods=('GET', 'POST'))
+@app_auth_required
+@user_auth_required
+@request_limit(50, 10)
+async def get_comments_replies()-> Response:
+    """
+    Gets the newest replies of a page of comments, with a single query, and the total quantity of replies of each one.
+
+    On GET, the request contains the arguments `comment_ids` and `limit`.
+    |arg comment_ids: Comma separated identifiers of the comments. At most 100
+    |arg limit: Limits the quantity of replies of each comment. Defaults to 3, maximum is 20
+
+    On POST, the JSON format to be passed by the call is at it follows:
+    {
+        "comment_ids": List[str],
+        "limit": int
+    }
+
+    :return: JSON serialized Response
+
+             Possible Responses:
+             200 - OK, with response:
+             {
+                 "success": True,
+                 "op": "get_comments_replies",
+                 "replies": {
+                    comment_id: {
+                        "replies": [
+                            {
+                                "comment_id": str,
+                                "user_id": int,
+                                "post_id": str,
+                                "reply_to": str,
+                                "comment": str,
+                                "created_date": datetime
+                            },
+                            ...
+                        ],
+                        "total": int
+                    },
+                    ...
+                 }
+             }
+             Comments with no replies, or that don't exist, have no `replies` and a `total` of 0.
+
+             400 - Bad Request:
+             {
+                 "success": False,
+                 "op": "get_comments_replies",
+                 "msg": "{reason}"
+             }
+
+             401 - Unauthorized:
+             {
+                 "success": False,
+                 "op": "get_comments_replies",
+                 "msg": "{reason}"
+             }
+
+             500 - Server Error:
+             {
+                 "success": False,
+                 "op": "get_comments_replies",
+                 "msg": "Internal Server Error",
+                 "stack_trace": str (Python stacktrace)
+             }
+    """
+    # noinspection PyBroadException
+    try:
+        if request.method == 'POST':
+            data = await api_request(await request.data)
+            comment_ids = data.comment_ids
+            limit = data.limit if data.limit is not None else 3
+        else:
+            comment_ids = request.args.get('comment_ids', None)
+            comment_ids = comment_ids.split(',') if comment_ids else None
+            limit = request.args.get('limit', 3)
+
+        limit = int(limit)
+        if not comment_ids or len(comment_ids) > MAX_REPLY_COMMENTS or not 1 <= limit <= MAX_REPLIES_PER_COMMENT:
+            return_data = await api_response(success=False, op=get_comments_replies.__name__,
+                                             msg='Malformed request data.', error='#MALFORMED_REQUEST')
+            return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
+
+        replies = await comment_controllers.get_reply_documents([str(i) for i in comment_ids], limit=limit)
+        data = {comment_id: {'replies': [reply_data(document) for document in value['replies']],
+                             'total': value['total']}
+                for comment_id, value in replies.items()}
+        return_data = await api_response(success=True, op=get_comments_replies.__name__, msg=None, replies=data)
+        return Response(return_data, status=200, mimetype='application/json', content_type='application/json', )
+    except (ValueError, TypeError):
+        return_data = await api_response(success=False, op=get_comments_replies.__name__,
+                                         msg='Malformed request data.', error='#MALFORMED_REQUEST')
+        return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
+    except Exception:
+        return await error_response(get_comments_replies.__name__, traceback.format_exc())
@@ -23,10 +23,11 @@
 
 from quart import Blueprint, request, Response
 from src.controllers import user_controllers, post_controllers, channel_controllers
+from src.models import post_serializers
 from .api_utils import app_auth_required, json_content_type_required, error_response, request_limit, user_auth_required
 from src.utils.json_handlers import api_request, api_response, SuperDict
 from src.utils.markdown import Markdown
-from typing import Union, Tuple
+from typing import Union, Tuple, List
 import traceback
 
 posts_api = Blueprint('posts', __name__, static_folder='./static', static_url_path='/static/files',
@@ -183,6 +184,16 @@ def validate_posts(posts_data: SuperDict)-> Union[bool, Tuple[bool, Tuple[int]]]
         return False, tuple(invalid_indexes)
 
 
+def requested_expansions()-> List[str]:
+    """
+    Reads the `expand` argument of the request: a comma separated list of post references to be expanded, like
+    `creator,channel`. Unknown references are ignored.
+    :return: List of the references to be expanded
+    """
+    expand = request.args.get('expand', '')
+    return [i for i in expand.split(',') if i in post_serializers.REFERENCE_LAYOUTS]
+
+
 @posts_api.route('/posts/add/', methods=('POST', ))
 @app_auth_required
 @json_content_type_required
@@ -430,7 +441,8 @@ async def add_posts()-> Response:
                     ap = await post_controllers.add_text_post(user_model=creator, channel_model=channel,
                                                               message_id=post.message_id, text=post.text,
                                                               tags=post.tags, source_map=post.source,
-                                                              links_map=post.links, reactions_list=post.reactions)
+                                                              links_map=post.links, reactions_list=post.reactions,
+                                                              commit=False)
                 if post.type == 'image':
                     if post.image.thumbnail is not None:
                         thumb_id = post.image.thumbnail.file_id
@@ -445,7 +457,7 @@ async def add_posts()-> Response:
                                                                thumbnail_file_id=thumb_id, thumbnail_size=thumb_size,
                                                                caption=post.image.caption, tags=post.tags,
                                                                source_map=post.source, links_map=post.links,
-                                                               reactions_list=post.reactions)
+                                                               reactions_list=post.reactions, commit=False)
                 if post.type == 'video':
                     if post.video.thumbnail is not None:
                         thumb_id = post.image.thumbnail.file_id
@@ -460,7 +472,8 @@ async def add_posts()-> Response:
                                                                mime_type=post.mime_type, thumbnail_file_id=thumb_id,
                                                                thumbnail_size=thumb_size, caption=post.video.caption,
                                                                tags=post.tags, source_map=post.source,
-                                                               links_map=post.links, reactions_list=post.reactions)
+                                                               links_map=post.links, reactions_list=post.reactions,
+                                                               commit=False)
                 if post.type == 'animation':
                     if post.image.thumbnail is not None:
                         thumb_id = post.image.thumbnail.file_id
@@ -480,7 +493,7 @@ async def add_posts()-> Response:
                                                                    thumbnail_size=thumb_size,
                                                                    caption=post.animation.caption, tags=post.tags,
                                                                    source_map=post.source, links_map=post.links,
-                                                                   reactions_list=post.reactions)
+                                                                   reactions_list=post.reactions, commit=False)
                 if post.type == 'video_note':
                     if post.image.thumbnail is not None:
                         thumb_id = post.image.thumbnail.file_id
@@ -499,7 +512,7 @@ async def add_posts()-> Response:
                                                                     thumbnail_size=thumb_size,
                                                                     caption=post.video_note.caption, tags=post.tags,
                                                                     source_map=post.source, links_map=post.links,
-                                                                    reactions_list=post.reactions)
+                                                                    reactions_list=post.reactions, commit=False)
                 if post.type == 'voice':
                     ap = await post_controllers.add_voice_post(user_model=creator, channel_model=channel,
                                                                message_id=post.message_id, file_id=post.voice.file_id,
@@ -507,7 +520,7 @@ async def add_posts()-> Response:
                                                                duration=post.voice.duration, mime_type=post.mime_type,
                                                                caption=post.voice.caption, tags=post.tags,
                                                                source_map=post.source, links_map=post.links,
-                                                               reactions_list=post.reactions)
+                                                               reactions_list=post.reactions, commit=False)
                 if post.type == 'audio':
                     if post.image.thumbnail is not None:
                         thumb_id = post.image.thumbnail.file_id
@@ -523,7 +536,8 @@ async def add_posts()-> Response:
                                                                thumbnail_file_id=thumb_id, thumbnail_size=thumb_size,
                                                                mime_type=post.mime_type, caption=post.caption,
                                                                tags=post.tags, source_map=post.source,
-                                                               links_map=post.links, reactions_list=post.reactions)
+                                                               links_map=post.links, reactions_list=post.reactions,
+                                                               commit=False)
                 if post.type == 'document':
                     if post.image.thumbnail is not None:
                         thumb_id = post.image.thumbnail.file_id
@@ -539,14 +553,14 @@ async def add_posts()-> Response:
                                                               thumbnail_file_id=thumb_id, thumbnail_size=thumb_size,
                                                               caption=post.document.caption, tags=post.tags,
                                                               source_map=post.source, links_map=post.links,
-                                                              reactions_list=post.reactions)
+                                                              reactions_list=post.reactions, commit=False)
                 if post.type == 'location':
                     ap = await post_controllers.add_location(user_model=creator, channel_model=channel,
                                                              message_id=post.message_id,
                                                              latitude=post.location.latitude,
                                                              longitude=post.location.longitude,
                                                              source_map=post.source, links_map=post.links,
-                                                             reactions_list=post.reactions)
+                                                             reactions_list=post.reactions, commit=False)
                 if post.type == 'venue':
                     ap = await post_controllers.add_venue(user_model=creator, channel_model=channel,
                                                           message_id=post.message_id,
@@ -556,14 +570,14 @@ async def add_posts()-> Response:
                                                           foursquare_id=post.venue.foursquare_id,
                                                           foursquare_type=post.venue.foursquare_type,
                                                           source_map=post.source, links_map=post.links,
-                                                          reactions_list=post.reactions)
+                                                          reactions_list=post.reactions, commit=False)
                 if ap is not None:
                     posts.append(ap)
 
             if len(posts) > 0:
-                posts_group = await post_controllers.add_post_group(posts=posts, user_model=creator,
-                                                                    channel_model=channel)
-                posts_list = [i.dict for i in posts]
+                posts_group = await post_controllers.add_posts(posts=posts, user_model=creator,
+                                                               channel_model=channel)
+                posts_list = post_serializers.serialize_many(post.to_son() for post in posts)
                 return_data = await api_response(success=True, op=add_posts.__name__, msg='Posts successfully added.',
                                                  qty=len(posts), group_hash=posts_group.posts_hash, posts=posts_list)
                 return Response(return_data, status=201, mimetype='application/json', content_type='application/json', )
@@ -595,6 +609,10 @@ async def get_post(post_id: str)-> Response:
     """
     Gets a post from the database
     :param post_id: The post unique identifier to retrieve from the database
+
+    The request can also contain an additional argument, `expand`.
+    |arg expand: Comma separated references to be returned as objects instead of IDs: `creator` and / or `channel`.
+
     :return: JSON serialized Response
 
              Possible Responses:
@@ -759,8 +777,11 @@ async def get_post(post_id: str)-> Response:
 
     # noinspection PyBroadException
     try:
-        post = await post_controllers.get_posts(post_id=str(post_id))
-        data = post.dict
+        document = await post_controllers.get_post_document(str(post_id))
+        data = post_serializers.serialize(document)
+        expand = requested_expansions()
+        if expand:
+            await post_serializers.expand_references([data], expand)
         return_data = await api_response(success=True, op=get_post.__name__, msg=None, post=data)
         return Response(return_data, status=200, mimetype='application/json', content_type='application/json', )
     except post_controllers.PostModel.DoesNotExist:
@@ -782,10 +803,15 @@ async def get_posts_group(group_hash: str)-> Response:
     Gets a post from the database
     :param group_hash: The group unique identifier to retrieve from the database
 
-    The request can also contain  additional arguments, `limit` and `skip`.
+    The request can also contain  additional arguments, `limit`, `skip`, `cursor` and `expand`.
+    Posts are returned in the order of the group.
     |arg limit: Limits the quantity of posts to be retrieved. Defaults to 30, maximum is 100
     |arg skip: Skips n posts. Best used to limit a quantity of posts to be retrieved, and skip the first n posts.
                defaults to 0.
+    |arg cursor: The `next_cursor` returned with the previous page. Takes precedence over `skip`, and keeps the pages
+                 stable if posts leave the group meanwhile.
+    |arg expand: Comma separated references to be returned as objects instead of IDs: `creator` and / or `channel`.
+               All the posts of the page are expanded with a single query per reference.
 
     :return: JSON serialized Response
 
@@ -850,7 +876,10 @@ async def get_posts_group(group_hash: str)-> Response:
                         PostType: PostData
                      },
                     ...
-                 ]
+                 ],
+                 "qty": int,
+                 "skipped": int,
+                 "next_cursor": str, or null if this is the last page
              }
             The Post types and their respective data is as it follows:
             "text": str,
@@ -981,21 +1010,27 @@ async def get_posts_group(group_hash: str)-> Response:
 
     # noinspection PyBroadException
     try:
-        skip = request.args.get('skip', 0)
-        limit = request.args.get('limit', 30)
-        if limit > 100:
-            limit = 100
-        group = await post_controllers.get_post_group(group_hash=str(group_hash))
-        posts = await post_controllers.get_posts(post_ids=group.posts)
-        posts = posts.skip(skip).limit(limit)
-        data = [i.dict for i in posts]
-        if len(data) > 0:
+        skip = max(int(request.args.get('skip', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 30)), 1), 100)
+        cursor = request.args.get('cursor', None)
+        group, documents, next_cursor = await post_controllers.get_post_group_page(str(group_hash), cursor=cursor,
+                                                                                  skip=skip, limit=limit)
+        data = post_serializers.serialize_many(documents)
+        expand = requested_expansions()
+        if expand:
+            await post_serializers.expand_references(data, expand)
+        if len(data) > 0 or skip > 0 or cursor is not None or len(group.posts) > limit:
             return_data = await api_response(success=True, op=get_posts_group.__name__, msg=None, posts=data,
-                                             qty=len(data), skipped=skip)
+                                             qty=len(data), skipped=skip, next_cursor=next_cursor)
             return Response(return_data, status=200, mimetype='application/json', content_type='application/json', )
         else:
+            # The first page covers the whole group, and every post of it is gone
             await post_controllers.remove_post_group(group_model=group)
             raise post_controllers.Posts.DoesNotExist('')
+    except ValueError:
+        return_data = await api_response(success=False, op=get_posts_group.__name__, msg='Malformed request data.',
+                                         error='#MALFORMED_REQUEST')
+        return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
     except post_controllers.Posts.DoesNotExist:
         return_data = await api_response(success=False, op=get_posts_group.__name__, msg="Post group doesn't exist.",
                                          error='#GROUP_NOT_FOUND')
@@ -1004,6 +1039,104 @@ async def get_posts_group(group_hash: str)-> Response:
         return await error_response(get_posts_group.__name__, traceback.format_exc())
 
 
+@posts_api.route('/posts/channel/<int:channel_id>/', methods=('GET', ))
+@posts_api.route('/posts/channel/', methods=('GET',), defaults={'channel_id': None})
+@app_auth_required
+@user_auth_required
+@request_limit(50, 10)
+async def get_channel_posts(channel_id: int)-> Response:
+    """
+    Gets the posts of a channel, newest first, one page at a time.
+    :param channel_id: The Telegram's ID of the channel
+
+    The request can also contain additional arguments, `limit`, `cursor` and `expand`.
+    |arg limit: Limits the quantity of posts in the page. Defaults to 30, maximum is 100
+    |arg cursor: The `next_cursor` returned with the previous page. Omit it to get the first page
+    |arg expand: Comma separated references to be returned as objects instead of IDs: `creator` and / or `channel`.
+
+    :return: JSON serialized Response
+
+             Possible Responses:
+             200 - OK, with response:
+             {
+                 "success": True,
+                 "op": "get_channel_posts",
+                 "posts": [
+                     {
+                        "creator": int,
+                        "channel": int,
+                        "mime_type": str,
+                        "type": str,
+                        ...
+                        PostType: PostData
+                     },
+                     ...
+                 ],
+                 "qty": int,
+                 "next_cursor": str, or null if this is the last page
+             }
+            The Post types and their respective data are the same returned by `get_post`.
+
+             400 - Bad Request:
+             {
+                 "success": False,
+                 "op": "get_channel_posts",
+                 "msg": "{reason}"
+             }
+
+             401 - Unauthorized:
+             {
+                 "success": False,
+                 "op": "get_channel_posts",
+                 "msg": "{reason}"
+             }
+
+             404 - Not Found:
+             {
+                "success": False,
+                "op": "get_channel_posts",
+                "msg": "{reason}"
+             }
+
+             500 - Server Error:
+             {
+                 "success": False,
+                 "op": "get_channel_posts",
+                 "msg": "Internal Server Error",
+                 "stack_trace": str (Python stacktrace)
+             }
+    """
+    if channel_id is None:
+        return_data = await api_response(success=False, op=get_channel_posts.__name__, msg='Malformed request data.',
+                                         error='#MALFORMED_REQUEST')
+        return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
+
+    # noinspection PyBroadException
+    try:
+        limit = min(max(int(request.args.get('limit', 30)), 1), 100)
+        cursor = request.args.get('cursor', None)
+        channel = await channel_controllers.get_channels(channel_id=int(channel_id))
+        documents, next_cursor = await post_controllers.get_channel_post_documents(channel.chid, cursor=cursor,
+                                                                                   limit=limit)
+        data = post_serializers.serialize_many(documents)
+        expand = requested_expansions()
+        if expand:
+            await post_serializers.expand_references(data, expand)
+        return_data = await api_response(success=True, op=get_channel_posts.__name__, msg=None, posts=data,
+                                         qty=len(data), next_cursor=next_cursor)
+        return Response(return_data, status=200, mimetype='application/json', content_type='application/json', )
+    except ValueError:
+        return_data = await api_response(success=False, op=get_channel_posts.__name__, msg='Malformed request data.',
+                                         error='#MALFORMED_REQUEST')
+        return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
+    except channel_controllers.Channel.DoesNotExist:
+        return_data = await api_response(success=False, op=get_channel_posts.__name__, msg='Channel does not exist.',
+                                         error='#CHANNEL_NOT_FOUND')
+        return Response(return_data, status=404, mimetype='application/json', content_type='application/json', )
+    except Exception:
+        return await error_response(get_channel_posts.__name__, traceback.format_exc())
+
+
 @posts_api.route('/posts/edit/<string:post_id>/', methods=('POST', 'PATCH',))
 @posts_api.route('/posts/edit/', methods=('POST', 'PATCH',), defaults={'post_id': None})
 @app_auth_required
@@ -25,6 +25,7 @@ from quart import Blueprint, request, Response
 from src.controllers import reaction_controllers, post_controllers
 from .api_utils import app_auth_required, json_content_type_required, error_response, request_limit
 from src.utils.json_handlers import api_request, api_response
+from src.models.config import MAX_REACTION_STATES
 import traceback
 
 reactions_api = Blueprint('reactions', __name__, static_folder='./static', static_url_path='/static/files',
@@ -137,3 +138,94 @@ async def react(post_id: str)-> Response:
         return Response(return_data, status=404, mimetype='application/json', content_type='application/json', )
     except Exception:
         return await error_response(op=react.__name__, stack_trace=traceback.format_exc())
+
+
+@reactions_api.route('/reactions/state/', methods=('GET', 'POST'))
+@app_auth_required
+@request_limit(60, 30)
+async def reaction_states()-> Response:
+    """
+    Gets, for a page of posts, the reaction counters of each post and the reaction a user picked on it. Nothing is
+    changed.
+
+    On GET, the request contains the arguments `user_id` and `post_ids`.
+    |arg user_id: Telegram's user ID
+    |arg post_ids: Comma separated identifiers of the posts. At most 100
+
+    On POST, the JSON format to be passed by the call is at it follows:
+    {
+        "user_id": int,
+        "post_ids": List[str]
+    }
+
+    :return: JSON serialized Response
+
+             Possible Responses:
+             200 - OK, with response:
+             {
+                 "success": True,
+                 "op": "reaction_states",
+                 "states": {
+                    post_id: {
+                        "reactions": [
+                            {
+                                "emoji": str,
+                                "count": int,
+                            },
+                            ...
+                        ],
+                        "total_count": int,
+                        "user_reaction": int, or null if the user didn't react
+                    },
+                    ...
+                 }
+             }
+             Posts that don't exist are left out of `states`.
+
+             400 - Bad Request:
+             {
+                 "success": False,
+                 "op": "reaction_states",
+                 "msg": "{reason}"
+             }
+
+             401 - Unauthorized:
+             {
+                 "success": False,
+                 "op": "reaction_states",
+                 "msg": "Unauthorized Application"
+             }
+
+             500 - Server Error:
+             {
+                 "success": False,
+                 "op": "reaction_states",
+                 "msg": "Internal Server Error",
+                 "stack_trace": str (Python stacktrace)
+             }
+    """
+    # noinspection PyBroadException
+    try:
+        if request.method == 'POST':
+            data = await api_request(await request.data)
+            user_id = data.user_id
+            post_ids = data.post_ids
+        else:
+            user_id = request.args.get('user_id', None)
+            post_ids = request.args.get('post_ids', None)
+            post_ids = post_ids.split(',') if post_ids else None
+
+        if user_id is None or not post_ids or len(post_ids) > MAX_REACTION_STATES:
+            return_data = await api_response(success=False, op=reaction_states.__name__,
+                                             msg='Malformed request data.', error='#MALFORMED_REQUEST')
+            return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
+
+        states = await reaction_controllers.get_reaction_states(int(user_id), [str(i) for i in post_ids])
+        return_data = await api_response(success=True, op=reaction_states.__name__, msg=None, states=states)
+        return Response(return_data, status=200, mimetype='application/json', content_type='application/json', )
+    except (ValueError, TypeError):
+        return_data = await api_response(success=False, op=reaction_states.__name__, msg='Malformed request data.',
+                                         error='#MALFORMED_REQUEST')
+        return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
+    except Exception:
+        return await error_response(op=reaction_states.__name__, stack_trace=traceback.format_exc())
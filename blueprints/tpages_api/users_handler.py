@@ -349,15 +349,16 @@ async def get_user(user_id: int)-> Response:  # Returns 'application/json'
         return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
     # noinspection PyBroadException
     try:
-        user = await user_controllers.get_users(user_id=int(user_id))
+        user = await user_controllers.get_user_fields(int(user_id), ('uid', 'first_name', 'last_name', 'username',
+                                                                     'profile_photo', 'profile_thumbnail'))
         data = {
-            "user_id": user.uid,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "user_name": user.username,
+            "user_id": user['uid'],
+            "first_name": user['first_name'],
+            "last_name": user['last_name'],
+            "user_name": user['username'],
             "profile_photo": {
-                "photo": user.profile_photo,
-                "thumbnail": user.profile_thumbnail
+                "photo": user['profile_photo'],
+                "thumbnail": user['profile_thumbnail']
             }
         }
         return_data = await api_response(success=True, op=get_user.__name__, msg=None, user=data)
@@ -690,14 +691,15 @@ async def get_bot(bot_id: int)-> Response:  # Returns 'application/json'
         return Response(return_data, status=400, mimetype='application/json', content_type='application/json', )
     # noinspection PyBroadException
     try:
-        bot = await user_controllers.get_bots(bot_id=bot_id)
+        bot = await user_controllers.get_bot_fields(bot_id, ('bot_id', 'name', 'username', 'profile_photo',
+                                                             'profile_thumbnail'))
         data = {
-            "bot_id": bot.bot_id,
-            "bot_name": bot.name,
-            "user_name": bot.username,
+            "bot_id": bot['bot_id'],
+            "bot_name": bot['name'],
+            "user_name": bot['username'],
             "profile_photo": {
-                "photo": bot.profile_photo,
-                "thumbnail": bot.profile_thumbnail
+                "photo": bot['profile_photo'],
+                "thumbnail": bot['profile_thumbnail']
             }
         }
         return_data = await api_response(success=True, op=get_bot.__name__, msg=None, bot=data)
@@ -33,6 +33,11 @@ APP_SECRET_KEY = 'Some Secret Unicode Key'
 APP_TEMP_SECRET_KEY = id_generator(32, )
 LAST_UPDATE = time.time()
 
+# Answers lookups of unknown post IDs from an in-memory filter, without reaching the database. The filter is rebuilt
+# every `POST_ID_FILTER_REFRESH` seconds; IDs issued after the last rebuild are always looked up in the database.
+USE_POST_ID_FILTER = False
+POST_ID_FILTER_REFRESH = 60 * 5
+
 
 def __reset_temp_key():
     """
@@ -0,0 +1,110 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+"""
+Maintenance commands, run against the database of the application:
+
+    python manage.py migrate-indexes
+    python manage.py dedup-reactions
+    python manage.py reconcile-reactions [--chunk-size N] [--concurrency N] [--dry-run]
+    python manage.py rerank-comments (--post POST_ID | --channel CHANNEL_ID) [--z Z]
+    python manage.py repair-comment-counters [--chunk-size N]
+"""
+
+from src.controllers import reaction_controllers, comment_controllers, post_controllers
+import argparse
+import asyncio
+
+
+async def migrate_indexes(args: argparse.Namespace):
+    dropped = await post_controllers.migrate_post_indexes()
+    print(f"Dropped indexes: {', '.join(dropped)}" if dropped else 'No legacy indexes found')
+
+
+async def dedup_reactions(args: argparse.Namespace):
+    stats = await reaction_controllers.dedup_user_reactions(args.chunk_size)
+    print(f"{stats['deleted']} duplicated reactions deleted from {stats['pairs']} users and posts")
+    if stats['deleted']:
+        print('Run reconcile-reactions to fix the reaction counters of the posts')
+
+
+async def reconcile_reactions(args: argparse.Namespace):
+    stats = await reaction_controllers.reconcile_reaction_counts(args.chunk_size, args.concurrency,
+                                                                 dry_run=args.dry_run)
+    print(f"{stats['scanned']} posts scanned in {stats['elapsed']:.2f}s ({stats['posts_per_second']:.0f} posts/s), "
+          f"{stats['skipped']} skipped with recent reactions")
+    print(f"{stats['drifted']} posts drifted by {stats['drift']} reactions (at most {stats['max_drift']} on a post), "
+          f"{stats['fixed']} fixed")
+
+
+async def rerank_comments(args: argparse.Namespace):
+    stats = await comment_controllers.rerank_comments(args.post, args.channel, z=args.z)
+    print(f"{stats['scanned']} comments scanned, {stats['updated']} re-ranked")
+
+
+async def repair_comment_counters(args: argparse.Namespace):
+    stats = await comment_controllers.repair_comment_counters(args.chunk_size)
+    print(f"{stats['scanned']} posts scanned, {stats['skipped']} skipped with recent comments, counters repaired on "
+          f"{stats['posts']} posts and {stats['comments']} comments")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintenance commands.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    migrate = commands.add_parser('migrate-indexes',
+                                  help='Drops the conflicting indexes of previous versions. Run it before serving.')
+    migrate.set_defaults(run=migrate_indexes)
+
+    dedup = commands.add_parser('dedup-reactions',
+                                help='Keeps only the newest reaction of each user to a post. Run it before serving.')
+    dedup.add_argument('--chunk-size', type=int, default=reaction_controllers.RECONCILE_CHUNK_SIZE)
+    dedup.set_defaults(run=dedup_reactions)
+
+    reconcile = commands.add_parser('reconcile-reactions',
+                                    help='Recomputes the reaction counters of the posts from the user reactions.')
+    reconcile.add_argument('--chunk-size', type=int, default=reaction_controllers.RECONCILE_CHUNK_SIZE)
+    reconcile.add_argument('--concurrency', type=int, default=reaction_controllers.RECONCILE_CONCURRENCY)
+    reconcile.add_argument('--dry-run', action='store_true', help='Only reports the drift, writing nothing.')
+    reconcile.set_defaults(run=reconcile_reactions)
+
+    rerank = commands.add_parser('rerank-comments',
+                                 help='Re-calculates the rank position of the comments of a post or a channel.')
+    target = rerank.add_mutually_exclusive_group(required=True)
+    target.add_argument('--post', help='Identifier of the post.')
+    target.add_argument('--channel', type=int, help="Telegram's ID of the channel.")
+    rerank.add_argument('--z', type=float, default=comment_controllers.COMMENT_RANK_Z,
+                        help='Quantile of the confidence level. Defaults to COMMENT_RANK_Z.')
+    rerank.set_defaults(run=rerank_comments)
+
+    repair = commands.add_parser('repair-comment-counters',
+                                 help='Recomputes the comment and reply counters of the posts and comments.')
+    repair.add_argument('--chunk-size', type=int, default=500)
+    repair.set_defaults(run=repair_comment_counters)
+
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(args.run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+from ..models.post_models import GlobalPostAnalytics, Sequence
+from ..models.config import ANALYTICS_SHARDS, ANALYTICS_FLUSH_INTERVAL, SEQUENCE_BLOCK_SIZE
+from ..models import async_db
+from ..utils.function_handlers import single_flight
+from pymongo.errors import WriteError, ServerSelectionTimeoutError
+from typing import Dict, List
+import asyncio
+import logging
+import random
+
+
+__LOGGER = logging.getLogger(__name__)
+# Deltas of the post counters not yet written, by the database name of the counter.
+__DELTAS: Dict[str, int] = {}
+# Reserved blocks of each sequence, as [next number, last number]
+__BLOCKS: Dict[str, List[int]] = {}
+__BLOCK_FLIGHTS = single_flight('sequence_blocks')
+
+
+def count(field: str, amount: int = 1)-> None:
+    """
+    Buffers an increment of a post counter. It only reaches the database on the next `flush`.
+    :param field: The attribute name of the counter in [GlobalPostAnalytics], like 'added_posts'
+    :param amount: Quantity to be added to the counter
+    """
+    name = async_db.mongo_name(GlobalPostAnalytics, field)
+    __DELTAS[name] = __DELTAS.get(name, 0) + amount
+
+
+async def flush()-> int:
+    """
+    Writes the buffered deltas to one of the counter shards, with a single atomic `$inc`. The deltas are kept for the
+    next flush only if the write surely did not happen (rejected, or no server reachable). When the outcome is unknown
+    (network errors, cancellation) or the write landed (write concern errors), they are dropped instead of risking
+    counting them twice.
+    :return: Quantity of counters written
+    """
+    global __DELTAS
+    if not __DELTAS:
+        return 0
+
+    deltas, __DELTAS = __DELTAS, {}
+    try:
+        shard = random.randint(1, ANALYTICS_SHARDS)
+        await async_db.update_one(GlobalPostAnalytics, {'_id': shard}, {'$inc': deltas}, upsert=True)
+    except (WriteError, ServerSelectionTimeoutError):
+        for name, amount in deltas.items():
+            __DELTAS[name] = __DELTAS.get(name, 0) + amount
+        raise
+    return len(deltas)
+
+
+async def run_flusher(interval: float = ANALYTICS_FLUSH_INTERVAL)-> None:
+    """
+    Flushes the buffered deltas every `interval` seconds, forever.
+    :param interval: Seconds between flushes
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush()
+        except Exception:
+            # Deltas not written are kept, and retried on the next round
+            __LOGGER.exception('Failed to flush the post counters')
+
+
+async def get_analytics()-> GlobalPostAnalytics:
+    """
+    Sums every counter shard, plus the deltas this worker has not flushed yet.
+    :return: [GlobalPostAnalytics] object with the totals. It is not meant to be saved.
+    """
+    names = [field.mongo_name for field in GlobalPostAnalytics._mongometa.get_fields() if field.mongo_name != '_id']
+    group = {'_id': None}
+    group.update({name: {'$sum': f'${name}'} for name in names})
+    result = await async_db.aggregate(GlobalPostAnalytics, [
+        {'$match': {'_id': {'$gte': 0, '$lte': ANALYTICS_SHARDS}}},
+        {'$group': group},
+    ])
+
+    totals = result[0] if result else {}
+    document = {'_id': 0}
+    for name in names:
+        document[name] = totals.get(name, 0) + __DELTAS.get(name, 0)
+    return GlobalPostAnalytics.from_document(document)
+
+
+async def _reserve_block(name: str, size: int)-> None:
+    """
+    Reserves the next `size` numbers of a sequence, with a single atomic `$inc`.
+    :param name: Name of the sequence
+    :param size: Quantity of numbers to be reserved
+    """
+    sequence = await async_db.find_one_and_update(Sequence, {'_id': name}, {'$inc': {'value': size}},
+                                                  upsert=True, projection={'value': 1})
+    __BLOCKS[name] = [sequence['value'] - size + 1, sequence['value']]
+
+
+async def next_number(name: str, block_size: int = SEQUENCE_BLOCK_SIZE)-> int:
+    """
+    Gets the next number of a sequence. Numbers come from a block reserved by this worker, so the database is only
+    reached once per `block_size` numbers. Numbers are unique across workers, but only increasing within a worker.
+    :param name: Name of the sequence
+    :param block_size: Quantity of numbers to be reserved when the current block runs out
+    :return: The number
+    """
+    while True:
+        block = __BLOCKS.get(name, None)
+        if block is not None and block[0] <= block[1]:
+            number = block[0]
+            block[0] += 1
+            return number
+        # Concurrent callers share a single reservation
+        await __BLOCK_FLIGHTS.do(name, _reserve_block, name, block_size)
+
+
+async def reserve_worker_id(bits: int)-> int:
+    """
+    Reserves an ID for this worker, unique among the last 2 ** `bits` reservations.
+    :param bits: Size of the worker ID, in bits
+    :return: The worker ID
+    """
+    return await next_number('workers', block_size=1) % (1 << bits)
@@ -21,16 +21,20 @@
 # SUCH DAMAGES.
 #
 
-from ..utils.security import id_generator, hash_generator
+from ..utils.security import hash_generator
+from ..utils.id_allocator import ids
 from ..utils.function_handlers import to_async, async_lru
-from pymodm import connect, MongoModel, fields, EmbeddedMongoModel
+from ..utils.executors import MONGO_WRITE
+from pymodm import MongoModel, fields, EmbeddedMongoModel
 from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference
 from ..models.config import *
+from ..models.connection import connect
+from ..models import async_db
 from typing import Union
 import datetime
 import bcrypt
 
-connect(f'{MONGO_URI}/app', alias='Application', ssl=USE_SSL, username=DB_ADMIN_USERNAME, password=DB_ADMIN_PASSWORD)
+connect('app', alias='Application')
 
 
 class AppManager(EmbeddedMongoModel):
@@ -119,24 +123,18 @@ async def create_app(manager_first_name: str, manager_last_name: str,
 
         _app.valid_until = datetime.datetime.utcnow() + datetime.timedelta(days=365)
         _app.app_is_valid = True
+        _old_hash = _app.app_hash
         if new_password is not None:
             new_salt = bcrypt.gensalt()
             _app.app_hash = hash_generator(_app.app_hash + new_salt.decode())
             _app.app_secure = bcrypt.hashpw((new_password + _app.app_hash).encode(), new_salt)
-            is_app_authorized.cache_clear()
-        save = to_async(_app.save)
+        save = to_async(_app.save, MONGO_WRITE)
         await save()
+        _invalidate_app(_old_hash)
         return _app
     else:
-        try:
-            _administration = __ApplicationAdministration.objects.get({'_id': 0})
-        except __ApplicationAdministration.DoesNotExist:
-            _administration = __ApplicationAdministration(_id=0, created_apps=0)
-
-        _administration.created_apps += 1
-        _administration.save()
         salt = bcrypt.gensalt()
-        _id = id_generator(16, start_num=_administration.created_apps, use_hex=True)
+        _id = ids.next_id()
         _hash = hash_generator(_id + salt.decode())
         _secure_key = bcrypt.hashpw((password + _hash).encode(), salt)
         _now = datetime.datetime.utcnow()
@@ -150,14 +148,16 @@ async def create_app(manager_first_name: str, manager_last_name: str,
             valid_until=_now + datetime.timedelta(days=365)
         )
         if _app.is_valid():
-            save = to_async(_app.save)
+            save = to_async(_app.save, MONGO_WRITE)
             await save(full_clean=True)
+            await async_db.update_one(__ApplicationAdministration, {'_id': 0}, {'$inc': {'createdApps': 1}},
+                                      upsert=True)
             return _app
         else:
             raise _app.full_clean()
 
 
-@async_lru(max_size=32)
+@async_lru(max_size=32, ttl=60)
 async def get_app(app_id: int=None, app_hash: str=None, manager_email=None)-> Union[Application, None]:
     """
     Gets the app from the database
@@ -177,7 +177,7 @@ async def get_app(app_id: int=None, app_hash: str=None, manager_email=None)-> Un
         return None
 
 
-@async_lru(max_size=32)
+@async_lru(max_size=256, ttl=60)
 async def is_app_authorized(app_hash: str)-> bool:
     """
     Checks if an app has authorization to use the API. Lazy but actually secure and functional approach.
@@ -191,6 +191,15 @@ async def is_app_authorized(app_hash: str)-> bool:
         return False
 
 
+def _invalidate_app(app_hash: str)-> None:
+    """
+    Drops the cached lookups of an app, so the next request sees its new state.
+    :param app_hash: The unique Hash of the app, before any change
+    """
+    get_app.cache_clear()
+    is_app_authorized.invalidate(app_hash)
+
+
 @async_lru(max_size=32)
 async def remove_app_authorization(app_id: int, app_hash: str)-> bool:
     """
@@ -202,8 +211,9 @@ async def remove_app_authorization(app_id: int, app_hash: str)-> bool:
     app = await get_app(app_id=app_id, app_hash=app_hash)
     if app is not None:
         app.app_is_valid = False
-        save = to_async(app.save)
+        save = to_async(app.save, MONGO_WRITE)
         await save()
+        _invalidate_app(app.app_hash)
         return True
     else:
         return False
@@ -221,8 +231,9 @@ async def _remove_app(app_id: int, app_hash: str)-> bool:
     if app is not None:
         app.is_deleted = True
         app.deleted_date = datetime.datetime.utcnow()
-        save = to_async(app.save)
+        save = to_async(app.save, MONGO_WRITE)
         await save()
+        _invalidate_app(app.app_hash)
         return True
     else:
         return False
@@ -242,8 +253,9 @@ async def remove_app(app_id: int, app_hash: str, password: str)-> bool:
         if bcrypt.checkpw(password, app.app_secure):
             app.is_deleted = True
             app.deleted_date = datetime.datetime.utcnow()
-            save = to_async(app.save)
+            save = to_async(app.save, MONGO_WRITE)
             await save()
+            _invalidate_app(app.app_hash)
             return True
         else:
             raise ValueError('Password doesn\'t match.')
@@ -24,8 +24,10 @@
 from ..models.user_models import User, Bot
 from ..models.post_models import PostModel, Posts
 from ..models.channels_model import Channel, ChannelAdmin
-from ..utils.function_handlers import to_async, temp_lru_cache
-from typing import List, Union, Iterable
+from ..models import async_db
+from ..utils.function_handlers import to_async, temp_lru_cache, single_flight
+from ..utils.executors import MONGO_WRITE
+from typing import Dict, List, Union, Iterable
 from .user_controllers import get_users, get_bots
 import datetime
 
@@ -34,7 +36,8 @@ class ChannelAlreadyAdded(BaseException):
     pass
 
 
-__CACHE = temp_lru_cache(4096)
+__CACHE = temp_lru_cache(16384, ttl=60*5)
+__FLIGHTS = single_flight('channels')
 
 
 async def add_channel(channel_id: int, user_id: int=None, user_model: User = None, *,
@@ -57,7 +60,8 @@ async def add_channel(channel_id: int, user_id: int=None, user_model: User = Non
         get = to_async(Channel.objects.get)
         _channel = await get({'channelId': channel_id})
         if _channel.is_deleted:
-            Channel.objects.raw({'channelId'}).update({'$set': {'isDeleted': False}, '$unset': {'deletedDate': ''}})
+            await async_db.update_many(Channel, {'channelId': channel_id},
+                                       {'$set': {'isDeleted': False}, '$unset': {'deletedDate': ''}})
             return await edit_channel_info(channel_id=channel_id, title=title, description=description,
                                            username=username, private_link=private_link, photo_id=photo_id)
         else:
@@ -83,7 +87,7 @@ async def add_channel(channel_id: int, user_id: int=None, user_model: User = Non
             if photo_id is not None:
                 channel.photo_id = photo_id
             if channel.is_valid():
-                save = to_async(channel.save)
+                save = to_async(channel.save, MONGO_WRITE)
                 await save(full_clean=True)
                 __CACHE[channel.chid] = channel
             else:
@@ -142,7 +146,7 @@ async def add_admins(channel_model: Channel = None, channel_id: int = None, *,
                     channel.authorized_admins.append(_admin)
         else:
             return False
-        save = to_async(channel.save)
+        save = to_async(channel.save, MONGO_WRITE)
         await save(full_clean=True)
         __CACHE[channel.chid] = channel
     except Channel.DoesNotExist:
@@ -180,7 +184,7 @@ async def remove_admins(channel_model: Channel = None, channel_id: int = None, *
 
         else:
             return False
-        save = to_async(channel.save)
+        save = to_async(channel.save, MONGO_WRITE)
         await save()
         __CACHE[channel.chid] = channel
 
@@ -214,12 +218,14 @@ async def edit_channel_bot(user_model: User = None, user_id: int = None,
 
         if channel.creator == user.uid:
             if bot_model is None and bot_id is None and bot_token is None:
-                Channel.objects.raw({'channelId': channel_id}).update({'$unset': {'channelBot': None}})
+                await async_db.update_many(Channel, {'channelId': channel.chid}, {'$unset': {'channelBot': ''}})
+                channel.channel_bot = None
+                __CACHE[channel.chid] = channel
                 return True
             else:
                 bot = bot_model if bot_model is not None else await get_bots(bot_id=bot_id, bot_token=bot_token)
                 channel.channel_bot = bot
-                save = to_async(channel.save)
+                save = to_async(channel.save, MONGO_WRITE)
                 await save()
                 __CACHE[channel.chid] = channel
                 return True
@@ -264,7 +270,7 @@ async def edit_channel_info(channel_model: Channel = None, channel_id: int = Non
             channel.photo_id = photo_id
 
         if channel.is_valid():
-            save = to_async(channel.save)
+            save = to_async(channel.save, MONGO_WRITE)
             await save(full_clean=True)
             __CACHE[channel.chid] = channel
             return channel
@@ -290,13 +296,13 @@ async def delete_channel(channel_model: Channel = None, channel_id: int = None)-
         channel.deleted_date = now
 
         if channel.is_valid():
-            save = to_async(channel.save)
-            posts_raw = to_async(PostModel.objects.raw)
-            posts_clt_raw = to_async(Posts.objects.raw)
+            save = to_async(channel.save, MONGO_WRITE)
+            posts_raw = to_async(PostModel.objects.raw, inline=True)
+            posts_clt_raw = to_async(Posts.objects.raw, inline=True)
             posts_clt = await posts_clt_raw({'channelId': channel.chid})
             all_posts = await posts_raw({'channelId': channel.chid})
-            posts_update = to_async(all_posts.update)
-            posts_clt_update = to_async(posts_clt.update)
+            posts_update = to_async(all_posts.update, MONGO_WRITE)
+            posts_clt_update = to_async(posts_clt.update, MONGO_WRITE)
             await posts_update({'isDeleted': True, 'deletedDate': now})
             await posts_clt_update({'isDeleted': True, 'deletedDate': now})
             await save(full_clean=True)
@@ -311,19 +317,35 @@ async def delete_channel(channel_model: Channel = None, channel_id: int = None)-
 
 async def get_channels(channel_id: int = None, channel_ids: List[int] = None)-> Union[Channel, Iterable[Channel]]:
     try:
-        get = to_async(Channel.objects.get)
-        raw = to_async(Channel.objects.raw)
+        raw = to_async(Channel.objects.raw, inline=True)
         if channel_id is not None:
             channel = __CACHE[channel_id]
             if channel is None:
-                channel = await get({'channelId': channel_id, 'isDeleted': False})
+                channel = await __FLIGHTS.do(channel_id, async_db.find_one, Channel,
+                                             {'channelId': channel_id, 'isDeleted': False})
+                __CACHE[channel_id] = channel
             return channel
         elif channel_ids is not None:
-            channels = await raw({'channelId': {'$in': channel_id}, 'isDeleted': False})
-            for channel in channels:
-                __CACHE[channel.chid] = channel
+            channels = await raw({'channelId': {'$in': channel_ids}, 'isDeleted': False})
+            __CACHE.set_many({channel.chid: channel for channel in channels})
             return channels
         else:
             raise Channel.DoesNotExist
     except Channel.DoesNotExist:
         raise
+
+
+async def get_channel_fields(channel_id: int, fields: Iterable[str])-> Dict[str, object]:
+    """
+    Gets only some fields of a single channel, as a plain dict, with no [Channel] instance. A channel already cached is
+    answered from the cache.
+    :param channel_id: The Telegram's ID of the channel
+    :param fields: The attribute names of the fields, as in [Channel]
+    :return: Dict of the fields, by their attribute names
+    """
+    fields = tuple(fields)
+    channel = __CACHE[channel_id]
+    if channel is not None:
+        return {field: getattr(channel, field) for field in fields}
+    return await __FLIGHTS.do((channel_id, fields), async_db.find_one_fields, Channel,
+                              {'channelId': channel_id, 'isDeleted': False}, fields)
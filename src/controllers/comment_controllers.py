@@ -21,16 +21,22 @@
 # SUCH DAMAGES.
 #
 
-from ..models.comments_model import Comment, CommentReply, CommentRank, UserGivenCommentRank
+from ..models.comments_model import BaseComment, Comment, CommentReply, CommentRank, UserGivenCommentRank
 from ..models.user_models import User
 from ..models.post_models import PostModel
 from .user_controllers import get_users
-from .post_controllers import get_posts
-from ..utils.security import id_generator
+from .post_controllers import get_posts, cached_post
+from ..utils.id_allocator import ids
 from ..utils.function_handlers import to_async, async_lru
-from typing import Union
-from pymongo import DESCENDING
-from math import sqrt
+from ..utils.ranking import confidence_many, confidence_expression
+from ..utils.cursors import encode_cursor, decode_cursor
+from ..utils.executors import MONGO_WRITE
+from ..models import async_db
+from ..models.config import COMMENT_RANK_Z, MAX_REPLY_COMMENTS, MAX_REPLIES_PER_COMMENT, RECONCILE_SETTLE_TIME
+from typing import Union, List, Tuple, Dict
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+import asyncio
 import datetime
 
 
@@ -53,20 +59,21 @@ async def add_comment(user_model: User = None, user_id: int = None, post_model:
         post = post_model if post_model is not None else await get_posts(post_id=post_id)
         try:
             if reply_to_model is not None or reply_to_id is not None:
-                reply_to = reply_to_model if reply_to_model is not None else get_comments(comment_id=reply_to_id)
+                reply_to = reply_to_model if reply_to_model is not None else \
+                    await get_comments(comment_id=reply_to_id)
             else:
                 reply_to = None
         except Comment.DoesNotExist:
             reply_to = None
 
-        _id = post.post_id + id_generator(16, use_hex=True)
+        _id = post.post_id + ids.next_id()
         comment_rank = CommentRank(
             rank_up_count=0,
             rank_down_count=0,
         )
 
         if reply_to is not None:
-            _id = reply_to.comment_id + id_generator(12, use_hex=True)
+            _id = reply_to.comment_id + ids.next_id()
             comment = CommentReply(
                 _id=_id,
                 comment_id=_id,
@@ -87,8 +94,12 @@ async def add_comment(user_model: User = None, user_id: int = None, post_model:
                 belongs_to=post
             )
         if comment.is_valid():
-            save = to_async(comment.save)
+            save = to_async(comment.save, MONGO_WRITE)
             await save(full_clean=True)
+            if reply_to is not None:
+                await _count_comments(post.post_id, replies=1, reply_to_id=reply_to.comment_id)
+            else:
+                await _count_comments(post.post_id, comments=1)
             return comment
         else:
             raise comment.full_clean()
@@ -113,7 +124,7 @@ async def edit_comment(comment_model: Union[Comment, CommentReply] = None,
         comment = comment_model if comment_model is not None else await get_comments(comment_id=comment_id)
         comment.comment = new_comment
         if comment.is_valid():
-            save = to_async(comment.save)
+            save = to_async(comment.save, MONGO_WRITE)
             await save(full_clean=True)
             return comment
         else:
@@ -122,32 +133,53 @@ async def edit_comment(comment_model: Union[Comment, CommentReply] = None,
         raise
 
 
-async def delete_comment(comment_model: Comment = None, comment_id: str = None)-> bool:
+async def delete_comment(comment_model: Union[Comment, CommentReply] = None, comment_id: str = None)-> bool:
     """
-    Deletes the comment, and all the associated replies and ranking votes, or a reply.
+    Deletes the comment, and all the associated replies and ranking votes, or a reply. The counters of the post, and of
+    the comment a reply belongs to, are decreased by what was actually deleted.
     :param comment_model: Comment reference model to identify the comment
     :param comment_id: An identifier of the comment. Used only if `comment_model` is None
-    :return: True if deleted, False if the comment was never added, or the Exception raised by the data validation
-             (less likely to happen).
+    :return: True if deleted, False if the comment was never added, or was already deleted.
     """
-    try:
-        comment = comment_model if comment_model is not None else get_comments(comment_id=comment_id)
-        if comment.reply_to is None:
-            try:
-                raw_replies = to_async(CommentReply.objects.raw)
-                replies = await raw_replies({'replyTo': comment.comment_id, 'isDeleted': False})
-                update_replies = to_async(replies.update)
-                await update_replies({'$set': {'deletedDate': datetime.datetime.utcnow(), 'isDeleted': True}})
-            except CommentReply.DoesNotExist:
-                pass
-        comment.is_deleted = True
-        comment.deleted_date = datetime.datetime.utcnow()
-        if comment.is_valid():
-            save = to_async(comment.save)
-            await save(full_clean=True)
-            return True
-    except Comment.DoesNotExist:
+    _id = comment_model.comment_id if comment_model is not None else comment_id
+    now = datetime.datetime.utcnow()
+    deleted = {'$set': {'deletedDate': now, 'isDeleted': True}}
+    # Only the call that flips `isDeleted` changes the counters. Replies share the collection of the comments
+    comment = await async_db.find_one_and_update(BaseComment, {'_id': _id, 'isDeleted': False}, deleted,
+                                                 projection={'postReference': 1, 'replyTo': 1})
+    if comment is None:
         return False
+    if comment_model is not None:
+        comment_model.is_deleted = True
+        comment_model.deleted_date = now
+
+    if comment.get('replyTo', None) is not None:
+        await _count_comments(comment['postReference'], replies=-1, reply_to_id=comment['replyTo'])
+    else:
+        replies = await async_db.update_many(CommentReply, {'replyTo': _id, 'isDeleted': False}, deleted)
+        await _count_comments(comment['postReference'], comments=-1, replies=-replies)
+    return True
+
+
+async def _count_comments(post_id: str, comments: int = 0, replies: int = 0, reply_to_id: str = None)-> None:
+    """
+    Adds to the comment and reply counters of a post, and to the reply counter of the comment replied. The post cached
+    is changed in place.
+    :param post_id: Post identifier on the database
+    :param comments: Quantity to be added to the comment counter of the post (negative to subtract)
+    :param replies: Quantity to be added to the reply counters (negative to subtract)
+    :param reply_to_id: (Optional) Identifier of the comment replied
+    """
+    increments = {'commentCount': comments, 'replyCount': replies}
+    writes = [async_db.update_one(PostModel, {'postId': post_id}, {'$inc': increments})]
+    if reply_to_id is not None and replies:
+        writes.append(async_db.update_one(Comment, {'_id': reply_to_id}, {'$inc': {'replyCount': replies}}))
+    await asyncio.gather(*writes)
+
+    post = cached_post(post_id)
+    if post is not None:
+        post.comment_count = max(0, (post.comment_count or 0) + comments)
+        post.reply_count = max(0, (post.reply_count or 0) + replies)
 
 
 async def get_comments(comment_id: str = None,
@@ -168,17 +200,17 @@ async def get_comments(comment_id: str = None,
     """
     try:
         get = to_async(Comment.objects.get)
-        raw = to_async(Comment.objects.raw)
+        raw = to_async(Comment.objects.raw, inline=True)
         if comment_id is not None:
-            comments = await get({'commentId': comment_id, 'replyTo': None})
+            return await get({'commentId': comment_id, 'replyTo': None})
         else:
             post = post_model if post_model is not None else await get_posts(post_id=post_id)
             if user_model is not None or user_id is not None:
                 user = user_model if user_model is not None else await get_users(user_id=user_id)
-                comments = await raw({'belongsTo': post.post_id, 'userId': user.uid, 'replyTo': None})
+                comments = await raw({'postReference': post.post_id, 'userId': user.uid, 'replyTo': None})
             else:
-                comments = await raw({'belongsTo': post.post_id, 'replyTo': None})
-        return comments.sort_by([('rankPosition', DESCENDING)])
+                comments = await raw({'postReference': post.post_id, 'replyTo': None})
+        return comments.order_by([('rankPosition', DESCENDING)])
     except Comment.DoesNotExist:
         return None
     except PostModel.DoesNotExist:
@@ -187,6 +219,37 @@ async def get_comments(comment_id: str = None,
         raise
 
 
+async def get_comment_documents(post_id: str, cursor: str = None,
+                                limit: int = 30)-> Tuple[List[dict], Union[str, None]]:
+    """
+    Gets a page of the comments of a post, best ranked first, as raw documents. Pages are keyset paginated on
+    (`rankPosition`, `_id`) through the `commentPostRankIndex`, so every page costs the same, however many comments the
+    post has.
+    :param post_id: Post identifier on the database
+    :param cursor: (Optional) The cursor returned with the previous page. None for the first page
+    :param limit: Maximum quantity of comments in the page
+    :return: Tuple of the list of raw comment documents, and the cursor of the next page (None if this is the last
+             one). Raises ValueError if the cursor is malformed
+    """
+    query = {'postReference': post_id, 'replyTo': None, 'isDeleted': False}
+    if cursor is not None:
+        rank_position, _id = decode_cursor(cursor, 2)
+        if not isinstance(rank_position, (int, float)) or isinstance(rank_position, bool) or not isinstance(_id, str):
+            raise ValueError('Malformed cursor.')
+        query['$or'] = [{'rankPosition': {'$lt': rank_position}},
+                        {'rankPosition': rank_position, '_id': {'$lt': _id}}]
+
+    # One extra comment tells if there is a next page
+    documents = await async_db.find_documents(Comment, query, {'_cls': 0, 'isDeleted': 0, 'deletedDate': 0},
+                                              sort=[('rankPosition', -1), ('_id', -1)], limit=limit + 1)
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last.get('rankPosition', 0.0), last['_id'])
+    return documents, next_cursor
+
+
 @async_lru(max_size=256)
 async def get_replies(comment_model: Comment = None,
                       comment_id: str = None)-> Union[CommentReply, None]:
@@ -197,7 +260,7 @@ async def get_replies(comment_model: Comment = None,
     :return: An iterable of [CommentReply] containing all replies to a comment.
     """
     try:
-        raw = to_async(CommentReply.objects.raw)
+        raw = to_async(CommentReply.objects.raw, inline=True)
         comment = comment_model if comment_model is not None else await get_comments(comment_id=comment_id)
         replies = await raw({'replyTo': comment.comment_id})
         return replies.sort([('createdDate', DESCENDING)])
@@ -207,70 +270,108 @@ async def get_replies(comment_model: Comment = None,
         return None
 
 
+async def get_reply_documents(comment_ids: List[str], limit: int = 3)-> Dict[str, dict]:
+    """
+    Gets the newest replies of many comments at once, as raw documents, with a single aggregation: each comment looks
+    up only its `limit` newest replies over the `commentReplyDateIndex`. The total of replies of each comment is its
+    `replyCount` counter, so the rest can be loaded later.
+    :param comment_ids: Identifiers of the comments. At most `MAX_REPLY_COMMENTS`
+    :param limit: Maximum quantity of replies of each comment. At most `MAX_REPLIES_PER_COMMENT`
+    :return: Dict mapping each comment ID to a dict with its `replies` (list of raw reply documents, newest first) and
+             the `total` quantity of replies. Comments with no replies are mapped to an empty list and a total of 0.
+    """
+    if len(comment_ids) > MAX_REPLY_COMMENTS:
+        raise ValueError(f'At most {MAX_REPLY_COMMENTS} comments are allowed.')
+    if not 1 <= limit <= MAX_REPLIES_PER_COMMENT:
+        raise ValueError(f'At most {MAX_REPLIES_PER_COMMENT} replies per comment are allowed.')
+
+    replies = {comment_id: {'replies': [], 'total': 0} for comment_id in comment_ids}
+    if not comment_ids:
+        return replies
+
+    comments = await async_db.aggregate(Comment, [
+        {'$match': {'_id': {'$in': comment_ids}}},
+        {'$lookup': {
+            'from': CommentReply._mongometa.collection_name,
+            'let': {'comment_id': '$_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$replyTo', '$$comment_id']}, 'isDeleted': False}},
+                {'$sort': {'createdDate': -1, '_id': -1}},
+                {'$limit': limit},
+                {'$project': {'_cls': 0, 'isDeleted': 0, 'deletedDate': 0}},
+            ],
+            'as': 'replies',
+        }},
+        {'$project': {'replies': 1, 'total': {'$ifNull': ['$replyCount', 0]}}},
+    ])
+    for comment in comments:
+        replies[comment['_id']] = {'replies': comment['replies'], 'total': comment['total']}
+    return replies
+
+
+# Changes of the (up, down) counters of a comment when a user changes the rank given, by (previous, new) rank type
+_RANK_DELTAS = {
+    (None, 'up'): (1, 0), (None, 'down'): (0, 1),
+    ('up', 'down'): (-1, 1), ('down', 'up'): (1, -1),
+    ('up', 'unrank'): (-1, 0), ('down', 'unrank'): (0, -1),
+}
+
+
 async def rank_comment(user_model: User = None, user_id: int = None, *, rank_type: str = 'up',
                        comment_model: Union[Comment, CommentReply] = None,
                        comment_id: str = None)-> Union[UserGivenCommentRank, None]:
     """
-    Gives a rank to a comment. Can give an up or a down. On give a rank, the comment position is re-calculated and
-    updated.
+    Gives a rank to a comment. Can give an up or a down. The rank of the user is upserted atomically on the unique
+    `rankUserCommentIndex`, and the counters of the comment are changed with a single update that `$inc`s them and
+    re-calculates the position from the new counts, so concurrent ranks never overwrite each other.
     :param user_model: User reference model to identify the user
     :param user_id: Telegram's user ID. Used only if `user_model` is None
     :param rank_type: The type of rank an user is giving. It can be either 'up', 'down' or 'unrank'
-    :param comment_model: Comment reference model to identify the comment
+    :param comment_model: Comment reference model to identify the comment. Its rank is updated in place.
     :param comment_id: An identifier of the comment. Used only if `comment_model` is None
     :return: [UserGivenCommentRank] instance of the rank an user gave.
     """
+    if rank_type not in ('up', 'down', 'unrank'):
+        raise ValueError(f'Invalid rank type: {rank_type}')
     try:
         user = user_model if user_model is not None else await get_users(user_id=user_id)
         comment = comment_model if comment_model is not None else await get_comments(comment_id=comment_id)
-        try:
-            get = to_async(UserGivenCommentRank.objects.get)
-            user_rank = await get({'userId': user.uid, 'commentId': comment.comment_id})
-            if user_rank.rank_type != rank_type:
-                if rank_type == 'unrank':
-                    if user_rank.rank_type == 'up':
-                        comment.rank.rank_up_count -= 1
-                    elif user_rank.rank_type == 'down':
-                        comment.rank.rank_down_count -= 1
-                else:
-                    if user_rank.rank_type == 'up':
-                        if comment.rank.rank_up_count > 0:
-                            comment.rank.rank_up_count -= 1
-                        comment.rank.rank_down_count += 1
-                    elif user_rank.rank_type == 'down':
-                        if comment.rank.rank_down_count > 0:
-                            comment.rank.rank_down_count -= 1
-                        comment.rank.rank_up_count += 1
-                    user_rank.rank_type = rank_type
-                    user_rank.rank_date = datetime.datetime.utcnow()
-
-        except UserGivenCommentRank.DoesNotExist:
-            user_rank = UserGivenCommentRank(
-                user_id=user,
-                comment_ranked=comment,
-                rank_type=rank_type,
-                rank_date=datetime.datetime.utcnow()
-
-            )
-            if rank_type == 'up':
-                comment.rank.rank_up_count += 1
-            elif rank_type == 'down':
-                comment.rank.rank_down_count += 1
+        now = datetime.datetime.utcnow()
+        query = {'userId': user.uid, 'commentId': comment.comment_id}
 
-        rank_position = confidence(comment.rank.rank_up_count, comment.rank.rank_down_count)
-
-        comment.rank_position = rank_position
-        save_comment = to_async(comment.save)
-        await save_comment()
+        if rank_type == 'unrank':
+            previous = await async_db.find_one_and_delete(UserGivenCommentRank, query, projection={'rankType': 1})
+        else:
+            # pymodm filters its queries on [UserGivenCommentRank] by `_cls`, so inserted ranks must carry it
+            update = {'$set': {'rankType': rank_type, 'rankDate': now},
+                      '$setOnInsert': {'_cls': UserGivenCommentRank._mongometa.object_name}}
+            try:
+                previous = await async_db.find_one_and_update(UserGivenCommentRank, query, update, upsert=True,
+                                                              projection={'rankType': 1}, return_new=False)
+            except DuplicateKeyError:
+                # A concurrent rank inserted the document first: this one is now an update
+                previous = await async_db.find_one_and_update(UserGivenCommentRank, query, update, upsert=True,
+                                                              projection={'rankType': 1}, return_new=False)
+
+        previous_type = previous['rankType'] if previous is not None else None
+        ups, downs = _RANK_DELTAS.get((previous_type, rank_type), (0, 0))
+        if ups or downs:
+            document = await async_db.find_one_and_update(
+                Comment, {'_id': comment.comment_id}, _rank_update(ups, downs),
+                projection={'rank': 1, 'rankPosition': 1})
+            if document is not None:
+                comment.rank.rank_up_count = document['rank']['upCount']
+                comment.rank.rank_down_count = document['rank']['downCount']
+                comment.rank_position = document['rankPosition']
 
         if rank_type == 'unrank':
-            delete_rank = to_async(user_rank.delete)
-            await delete_rank()
             return None
-        else:
-            save_rank = to_async(user_rank.save)
-            await save_rank(full_clean=True)
-            return user_rank
+        return UserGivenCommentRank(
+            user_id=user,
+            comment_ranked=comment,
+            rank_type=rank_type,
+            rank_date=now
+        )
 
     except Comment.DoesNotExist:
         raise
@@ -278,32 +379,136 @@ async def rank_comment(user_model: User = None, user_id: int = None, *, rank_typ
         raise
 
 
-# Pure Python Implementation of the Wilson Score Interval, to calculate the ranking of comments.
-# The algorithm can be seen implemented on reddit, as followed:
-# https://github.com/reddit-archive/reddit/blob/master/r2/r2/lib/db/_sorts.pyx
-# The explanation of the Wilson Score Interval can be found here:
-# http://www.evanmiller.org/how-not-to-sort-by-average-rating.html
-
-
-async def _confidence(ups, downs):
-    n = ups + downs
-
-    if n == 0:
-        return 0
-
-    z = 1.281551565545  # 80% confidence
-    p = float(ups) / n
-
-    left = p + 1/(2*n)*z*z
-    right = z*sqrt(p*(1-p)/n + z*z/(4*n*n))
-    under = 1+1/n*z*z
-
-    return (left - right) / under
+def _rank_update(ups: int, downs: int)-> List[dict]:
+    """
+    Builds the pipeline update that adds to the rank counters of a comment (never below 0), then sets its
+    `rankPosition` from the counters just written.
+    :param ups: Quantity to be added to the up counter
+    :param downs: Quantity to be added to the down counter
+    :return: List of the stages of the update
+    """
+    return [
+        {'$set': {
+            'rank.upCount': {'$max': [0, {'$add': [{'$ifNull': ['$rank.upCount', 0]}, ups]}]},
+            'rank.downCount': {'$max': [0, {'$add': [{'$ifNull': ['$rank.downCount', 0]}, downs]}]},
+        }},
+        {'$set': {'rankPosition': confidence_expression('$rank.upCount', '$rank.downCount')}},
+    ]
 
 
-@async_lru(max_size=2048)
-async def confidence(ups, downs):
-    if ups + downs == 0:
-        return 0
+async def rerank_comments(post_id: str = None, channel_id: int = None, *, z: float = COMMENT_RANK_Z,
+                          chunk_size: int = 1000)-> dict:
+    """
+    Re-calculates the `rankPosition` of every comment of a post, or of all the posts of a channel, after a change of the
+    confidence level. Comments are read in chunks, paginated by `_id`, scored at once with `confidence_many` and written
+    with a single `bulk_write` per chunk. A position is only written if the counters did not change since they were
+    read; comments ranked meanwhile already got a position from `rank_comment`.
+    :param post_id: Post identifier on the database
+    :param channel_id: Telegram's channel ID. Used only if `post_id` is None
+    :param z: The quantile of the confidence level
+    :param chunk_size: Quantity of comments scored at once
+    :return: Dict with the quantity of comments `scanned` and `updated`
+    """
+    if post_id is not None:
+        post_ids = [post_id]
+    elif channel_id is not None:
+        posts = await async_db.find_documents(PostModel, {'channelId': channel_id}, {'_id': 1})
+        post_ids = [post['_id'] for post in posts]
     else:
-        return await _confidence(ups, downs) * 100
+        raise ValueError('A post or a channel is required.')
+
+    stats = {'scanned': 0, 'updated': 0}
+    last_id = None
+    while post_ids:
+        query = {'postReference': {'$in': post_ids}, 'replyTo': None}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        comments = await async_db.find_documents(Comment, query, {'_id': 1, 'rank': 1},
+                                                 sort=[('_id', 1)], limit=chunk_size)
+        if not comments:
+            break
+        last_id = comments[-1]['_id']
+
+        ups = [(comment.get('rank', None) or {}).get('upCount', 0) for comment in comments]
+        downs = [(comment.get('rank', None) or {}).get('downCount', 0) for comment in comments]
+        requests = [UpdateOne({'_id': comment['_id'], 'rank.upCount': up, 'rank.downCount': down},
+                              {'$set': {'rankPosition': position}})
+                    for comment, up, down, position in zip(comments, ups, downs, confidence_many(ups, downs, z))]
+        result = await async_db.bulk_write(Comment, requests)
+        stats['scanned'] += len(comments)
+        stats['updated'] += result.modified_count
+    return stats
+
+
+async def repair_comment_counters(chunk_size: int = 500)-> dict:
+    """
+    Recomputes the comment and reply counters of every post, and the reply counters of their comments, from the
+    `comments` collection, and writes the ones that are wrong. Posts are paginated by `_id`, and the comments of each
+    chunk are counted with a single aggregation; the counters are read after it. Posts with comments added or deleted
+    within the last `RECONCILE_SETTLE_TIME` seconds are skipped, as their counters may not include those yet, and a
+    counter is only replaced if it did not change since it was read. A comment added while a chunk is counted may
+    still leave its counters off by one, which the next run fixes.
+    :param chunk_size: Quantity of posts counted by each aggregation
+    :return: Dict with the quantity of posts `scanned` and `skipped`, and of `posts` and `comments` repaired
+    """
+    stats = {'scanned': 0, 'skipped': 0, 'posts': 0, 'comments': 0}
+    last_id = None
+    while True:
+        query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+        page = await async_db.find_documents(PostModel, query, {'_id': 1}, sort=[('_id', 1)], limit=chunk_size)
+        if not page:
+            break
+        last_id = page[-1]['_id']
+        post_ids = [post['_id'] for post in page]
+
+        # Deleted comments are only counted for the date of their last change
+        groups = await async_db.aggregate(BaseComment, [
+            {'$match': {'postReference': {'$in': post_ids}}},
+            {'$group': {'_id': {'postId': '$postReference', 'replyTo': {'$ifNull': ['$replyTo', None]}},
+                        'count': {'$sum': {'$cond': ['$isDeleted', 0, 1]}},
+                        'changed': {'$max': {'$ifNull': ['$deletedDate', '$createdDate']}}}},
+        ])
+        posts, comments = await asyncio.gather(
+            async_db.find_documents(PostModel, {'_id': {'$in': post_ids}},
+                                    {'_id': 1, 'commentCount': 1, 'replyCount': 1}),
+            async_db.find_documents(Comment, {'postReference': {'$in': post_ids}, 'replyTo': None, 'isDeleted': False},
+                                    {'_id': 1, 'postReference': 1, 'replyCount': 1}))
+
+        settled = datetime.datetime.utcnow() - datetime.timedelta(seconds=RECONCILE_SETTLE_TIME)
+        comment_counts: Dict[str, int] = {}
+        reply_counts: Dict[str, int] = {}
+        replies_of: Dict[str, int] = {}
+        unsettled = set()
+        for group in groups:
+            post_id, reply_to = group['_id']['postId'], group['_id']['replyTo']
+            if group['changed'] is not None and group['changed'] > settled:
+                unsettled.add(post_id)
+            if reply_to is None:
+                comment_counts[post_id] = group['count']
+            else:
+                reply_counts[post_id] = reply_counts.get(post_id, 0) + group['count']
+                replies_of[reply_to] = group['count']
+
+        post_requests = [
+            UpdateOne({'_id': post['_id'], 'commentCount': post.get('commentCount'),
+                       'replyCount': post.get('replyCount')},
+                      {'$set': {'commentCount': comment_counts.get(post['_id'], 0),
+                                'replyCount': reply_counts.get(post['_id'], 0)}})
+            for post in posts
+            if post['_id'] not in unsettled
+            and (post.get('commentCount') != comment_counts.get(post['_id'], 0)
+                 or post.get('replyCount') != reply_counts.get(post['_id'], 0))]
+        comment_requests = [
+            UpdateOne({'_id': comment['_id'], 'replyCount': comment.get('replyCount')},
+                      {'$set': {'replyCount': replies_of.get(comment['_id'], 0)}})
+            for comment in comments
+            if comment['postReference'] not in unsettled
+            and comment.get('replyCount') != replies_of.get(comment['_id'], 0)]
+
+        stats['scanned'] += len(posts)
+        stats['skipped'] += len(unsettled)
+        if post_requests:
+            stats['posts'] += (await async_db.bulk_write(PostModel, post_requests)).modified_count
+        if comment_requests:
+            stats['comments'] += (await async_db.bulk_write(Comment, comment_requests)).modified_count
+    return stats
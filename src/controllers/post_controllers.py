@@ -23,22 +23,39 @@
 
 from ..models.post_models import ImagePost, TextPost, AnimationPost, AudioPost, LocationPost, VenuePost
 from ..models.post_models import VideoPost, VoicePost, VideoNotePost, DocumentPost, PostModel
-from ..models.post_models import Posts, Link, LinkList, GlobalPostAnalytics
+from ..models.post_models import Posts, Link, LinkList
+from ..models import async_db
 from ..models.reactions_model import Reaction
 from ..models.user_models import User
 from ..models.channels_model import Channel
 from ..models.comments_model import Comment
 from .user_controllers import get_users
 from .channel_controllers import get_channels
-from typing import List, Union, Dict, Iterable
-from ..utils.security import id_generator, hash_generator
-from ..utils.function_handlers import to_async, temp_lru_cache
+from typing import List, Union, Dict, Iterable, Tuple
+from ..utils.security import hash_generator
+from ..utils.id_allocator import ids, IdAllocator
+from ..utils.function_handlers import to_async, temp_lru_cache, single_flight
+from ..utils.executors import MONGO_WRITE
+from ..utils.bloom_filter import BloomFilter
+from ..utils.cursors import encode_cursor, decode_cursor
 from .reaction_controllers import create_reaction
+from . import analytics_controllers
 import datetime
 
 
-__POST_CACHE = temp_lru_cache(max_size=8192)
-__POST_GROUP_CACHE = temp_lru_cache(max_size=2048)
+__POST_CACHE = temp_lru_cache(max_size=32768, ttl=60*10, shards=32)
+__POST_GROUP_CACHE = temp_lru_cache(max_size=4096, ttl=60*10)
+__POST_FLIGHTS = single_flight('posts')
+# Post IDs recently found not to exist. Short lived, since another worker may add the post meanwhile.
+__POST_MISSES = temp_lru_cache(max_size=16384, ttl=30)
+# Optional filter of every known post ID, only used after `build_post_id_filter` is called. It misses the posts added
+# by other processes since it was built, so IDs issued after `__POST_ID_FILTER_DATE` are always looked up.
+__POST_ID_FILTER: BloomFilter = None
+__POST_ID_FILTER_DATE: datetime.datetime = None
+# Clock difference tolerated between the processes issuing post IDs
+__ID_CLOCK_SKEW = datetime.timedelta(seconds=60)
+# Indexes of the posts collection dropped by previous versions of [PostModel]
+__LEGACY_POST_INDEXES = ['postGroupHashIndex']
 
 
 async def add_post_group(posts: List[PostModel],
@@ -54,35 +71,58 @@ async def add_post_group(posts: List[PostModel],
     :return: [Posts] object containing a reference to all the posts in the group
     """
     try:
-        post_strings = []
-        _post_hash = ''
-        for post in posts:
-            post_strings.append(post.post_id)
-            _post_hash += post.post_id
-
-        posts_hash = hash_generator(_post_hash)
-
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        _posts = Posts(
-            _id=posts_hash,
-            posts_hash=posts_hash,
-            creator=creator,
-            channel=channel,
-            date_created=datetime.datetime.utcnow(),
-            posts=post_strings
-        )
+        _posts = _create_post_group(posts, creator, channel)
         if _posts.is_valid():
-            save = to_async(_posts.save)
+            save = to_async(_posts.save, MONGO_WRITE)
             await save(full_clean=True)
-            raw = to_async(PostModel.objects.raw)
-            posts_group = await raw({'postId': {'$in': post_strings}})
-            update = to_async(posts_group.update)
-            await update({'$set': {'groupHash': posts_hash}})
+            await async_db.update_many(PostModel, {'postId': {'$in': _posts.posts}},
+                                       {'$set': {'groupHash': _posts.posts_hash}})
+            for post in posts:
+                post.group_hash = _posts.posts_hash
             __POST_GROUP_CACHE[_posts.posts_hash] = _posts
+            __POST_CACHE.set_many({post.post_id: post for post in posts})
+        else:
+            raise _posts.full_clean()
+
+        return _posts
+    except User.DoesNotExist:
+        raise
+    except Channel.DoesNotExist:
+        raise
+
+
+async def add_posts(posts: List[PostModel],
+                    user_model: User = None, user_id: int = None,
+                    channel_model: Channel = None, channel_id: int = None)-> Posts:
+    """
+    Adds new posts, and their group, at once: the posts are written with a single `insert_many`, already carrying the
+    hash of the group, followed by the group itself.
+    :param posts: Posts built with `commit=False`, not yet on the database
+    :param user_model: Creator of the posts. Should be either it's model, or it's ID
+    :param user_id: Creator of the posts. Should be either it's model, or it's ID
+    :param channel_model: Channel to where the posts belongs. Should be either it's model, or it's ID
+    :param channel_id: Channel to where the posts belongs. Should be either it's model, or it's ID
+    :return: [Posts] object containing a reference to all the posts in the group
+    """
+    try:
+        creator = user_model if user_model is not None else await get_users(user_id=user_id)
+        channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
+
+        _posts = _create_post_group(posts, creator, channel)
+        if _posts.is_valid():
             for post in posts:
-                __POST_CACHE[post.post_id] = post
+                post.group_hash = _posts.posts_hash
+            # The posts were validated when built
+            await async_db.insert_many(posts, full_clean=False)
+            await async_db.insert_one(_posts, full_clean=False)
+
+            analytics_controllers.count('added_posts', len(posts))
+            for post in posts:
+                _register_new_post(post)
+            __POST_GROUP_CACHE[_posts.posts_hash] = _posts
         else:
             raise _posts.full_clean()
 
@@ -106,19 +146,19 @@ async def remove_post_group(group_model: Posts = None, group_hash: str = None)->
         posts = await get_posts(post_ids=posts_group.posts)
         posts_group.is_deleted = True
         posts_group.deleted_date = datetime.datetime.utcnow()
-        raw_comments = to_async(Comment.objects.raw)
+        raw_comments = to_async(Comment.objects.raw, inline=True)
         _comments = await raw_comments({'postReference': {'$in': posts_group.posts}})
         if posts_group.is_valid():
             data = {'$set': {'deletedDate': datetime.datetime.utcnow(), 'isDeleted': True}}
-            update_comments = to_async(_comments.update)
+            update_comments = to_async(_comments.update, MONGO_WRITE)
             await update_comments(data)
-            posts_update = to_async(posts.update)
+            posts_update = to_async(posts.update, MONGO_WRITE)
             await posts_update(data)
-            group_save = to_async(posts_group.save)
+            group_save = to_async(posts_group.save, MONGO_WRITE)
             await group_save(full_clean=True)
             del __POST_GROUP_CACHE[posts_group.posts_hash]
             for post in posts_group.posts:
-                del __POST_GROUP_CACHE[post]
+                del __POST_CACHE[post]
             return True
         else:
             raise posts_group.full_clean()
@@ -137,6 +177,7 @@ async def get_post_group(group_hash: str)-> Posts:
         post_group = __POST_GROUP_CACHE[group_hash]
         if post_group is None:
             post_group = await get({'groupHash': group_hash})
+            __POST_GROUP_CACHE[group_hash] = post_group
         return post_group
     except Posts.DoesNotExist:
         raise
@@ -153,7 +194,8 @@ async def add_text_post(user_model: User = None, user_id: int = None,
                         links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                         reactions: Reaction = None,
                         reactions_list: List[str] = None,
-                        reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> TextPost:
+                        reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                        commit: bool = True) -> TextPost:
     """
     Adds a Text Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -175,6 +217,7 @@ async def add_text_post(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [TextPost] object referencing the post saved on the database.
     """
 
@@ -182,15 +225,7 @@ async def add_text_post(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -233,11 +268,11 @@ async def add_text_post(user_model: User = None, user_id: int = None,
             text_post.links = _links
 
         if text_post.is_valid():
-            save = to_async(text_post.save)
-            await save(full_clean=True)
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[text_post.post_id] = text_post
+            if commit:
+                save = to_async(text_post.save, MONGO_WRITE)
+                await save(full_clean=True)
+                analytics_controllers.count('added_posts')
+                _register_new_post(text_post)
         else:
             raise text_post.full_clean()
 
@@ -265,7 +300,8 @@ async def add_image_post(user_model: User = None, user_id: int = None,
                          links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                          reactions: Reaction = None,
                          reactions_list: List[str] = None,
-                         reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> ImagePost:
+                         reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                         commit: bool = True) -> ImagePost:
     """
     Adds an Image Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -293,6 +329,7 @@ async def add_image_post(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [ImagePost] object referencing the post saved on the database.
     """
 
@@ -300,15 +337,7 @@ async def add_image_post(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -360,12 +389,12 @@ async def add_image_post(user_model: User = None, user_id: int = None,
             image_post.thumbnail_size = thumbnail_size
 
         if image_post.is_valid():
-            save = to_async(image_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(image_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[image_post.post_id] = image_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(image_post)
 
         else:
             raise image_post.full_clean()
@@ -396,7 +425,8 @@ async def add_video_post(user_model: User = None, user_id: int = None,
                          links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                          reactions: Reaction = None,
                          reactions_list: List[str] = None,
-                         reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> VideoPost:
+                         reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                         commit: bool = True) -> VideoPost:
     """
     Adds a Video Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -426,6 +456,7 @@ async def add_video_post(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [VideoPost] object referencing the post saved on the database.
     """
 
@@ -433,15 +464,7 @@ async def add_video_post(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -494,12 +517,12 @@ async def add_video_post(user_model: User = None, user_id: int = None,
             video_post.thumbnail_size = thumbnail_size
 
         if video_post.is_valid():
-            save = to_async(video_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(video_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[video_post.post_id] = video_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(video_post)
 
         else:
             raise video_post.full_clean()
@@ -529,7 +552,8 @@ async def add_video_note_post(user_model: User = None, user_id: int = None,
                               links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                               reactions: Reaction = None,
                               reactions_list: List[str] = None,
-                              reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> VideoNotePost:
+                              reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                              commit: bool = True) -> VideoNotePost:
     """
     Adds a VideoNote Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -558,6 +582,7 @@ async def add_video_note_post(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [VideoNotePost] object referencing the post saved on the database.
     """
 
@@ -565,15 +590,7 @@ async def add_video_note_post(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -625,12 +642,12 @@ async def add_video_note_post(user_model: User = None, user_id: int = None,
             video_note_post.thumbnail_size = thumbnail_size
 
         if video_note_post.is_valid():
-            save = to_async(video_note_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(video_note_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[video_note_post.post_id] = video_note_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(video_note_post)
 
         else:
             raise video_note_post.full_clean()
@@ -662,7 +679,8 @@ async def add_animation_post(user_model: User = None, user_id: int = None,
                              links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                              reactions: Reaction = None,
                              reactions_list: List[str] = None,
-                             reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> AnimationPost:
+                             reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                             commit: bool = True) -> AnimationPost:
     """
     Adds an Animation Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -693,6 +711,7 @@ async def add_animation_post(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [AnimationPost] object referencing the post saved on the database.
     """
 
@@ -700,15 +719,7 @@ async def add_animation_post(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -762,12 +773,12 @@ async def add_animation_post(user_model: User = None, user_id: int = None,
             animation_post.thumbnail_size = thumbnail_size
 
         if animation_post.is_valid():
-            save = to_async(animation_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(animation_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[animation_post.post_id] = animation_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(animation_post)
 
         else:
             raise animation_post.full_clean()
@@ -794,7 +805,8 @@ async def add_voice_post(user_model: User = None, user_id: int = None,
                          links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                          reactions: Reaction = None,
                          reactions_list: List[str] = None,
-                         reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> VoicePost:
+                         reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                         commit: bool = True) -> VoicePost:
     """
     Adds a Voice Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -820,6 +832,7 @@ async def add_voice_post(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [VoicePost] object referencing the post saved on the database.
     """
 
@@ -827,15 +840,7 @@ async def add_voice_post(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -882,12 +887,12 @@ async def add_voice_post(user_model: User = None, user_id: int = None,
             voice_post.caption = caption
 
         if voice_post.is_valid():
-            save = to_async(voice_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(voice_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[voice_post.post_id] = voice_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(voice_post)
 
         else:
             raise voice_post.full_clean()
@@ -918,7 +923,8 @@ async def add_audio_post(user_model: User = None, user_id: int = None,
                          links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                          reactions: Reaction = None,
                          reactions_list: List[str] = None,
-                         reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> AudioPost:
+                         reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                         commit: bool = True) -> AudioPost:
     """
     Adds an Audio Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -948,6 +954,7 @@ async def add_audio_post(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [AudioPost] object referencing the post saved on the database.
     """
 
@@ -955,15 +962,7 @@ async def add_audio_post(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -1018,12 +1017,12 @@ async def add_audio_post(user_model: User = None, user_id: int = None,
             audio_post.thumbnail_size = thumbnail_size
 
         if audio_post.is_valid():
-            save = to_async(audio_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(audio_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[audio_post.post_id] = audio_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(audio_post)
 
         else:
             raise audio_post.full_clean()
@@ -1052,7 +1051,8 @@ async def add_file_post(user_model: User = None, user_id: int = None,
                         links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                         reactions: Reaction = None,
                         reactions_list: List[str] = None,
-                        reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> DocumentPost:
+                        reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                        commit: bool = True) -> DocumentPost:
     """
     Adds a Document Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -1080,6 +1080,7 @@ async def add_file_post(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [DocumentPost] object referencing the post saved on the database.
     """
 
@@ -1087,15 +1088,7 @@ async def add_file_post(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -1148,12 +1141,12 @@ async def add_file_post(user_model: User = None, user_id: int = None,
             document_post.thumbnail_size = thumbnail_size
 
         if document_post.is_valid():
-            save = to_async(document_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(document_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[document_post.post_id] = document_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(document_post)
 
         else:
             raise document_post.full_clean()
@@ -1177,7 +1170,8 @@ async def add_location(user_model: User = None, user_id: int = None,
                        links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                        reactions: Reaction = None,
                        reactions_list: List[str] = None,
-                       reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> DocumentPost:
+                       reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                       commit: bool = True) -> DocumentPost:
     """
     Adds a Location Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -1199,6 +1193,7 @@ async def add_location(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [LocationPost] object referencing the post saved on the database.
     """
 
@@ -1206,15 +1201,7 @@ async def add_location(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -1255,12 +1242,12 @@ async def add_location(user_model: User = None, user_id: int = None,
             location_post.links = _links
 
         if location_post.is_valid():
-            save = to_async(location_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(location_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[location_post.post_id] = location_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(location_post)
 
         else:
             raise location_post.full_clean()
@@ -1288,7 +1275,8 @@ async def add_venue(user_model: User = None, user_id: int = None,
                     links_map: Union[Dict[str, List[Dict[str, str]]], Dict[str, int]] = None,
                     reactions: Reaction = None,
                     reactions_list: List[str] = None,
-                    reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None) -> DocumentPost:
+                    reactions_map: List[Union[Dict[str, str], Dict[str, int]]] = None,
+                    commit: bool = True) -> DocumentPost:
     """
     Adds a Location Post to the database.
     :param user_model: Creator of the posts. Should be either it's model, or it's ID
@@ -1314,6 +1302,7 @@ async def add_venue(user_model: User = None, user_id: int = None,
                            or a dict mapping the emojis and an initial count
     :param reactions_map: The reactions of the post. This is either a [Reaction] object, a list of unicode emojis, or a
                           dict mapping the emojis and an initial count
+    :param commit: If False, the post is only built and validated, to be written later by `add_posts`
     :return: [LocationPost] object referencing the post saved on the database.
     """
 
@@ -1321,15 +1310,7 @@ async def add_venue(user_model: User = None, user_id: int = None,
         creator = user_model if user_model is not None else await get_users(user_id=user_id)
         channel = channel_model if channel_model is not None else await get_channels(channel_id=channel_id)
 
-        try:
-            global_analytics = GlobalPostAnalytics.objects.get({'_id': 0})
-        except GlobalPostAnalytics.DoesNotExist:
-            global_analytics = GlobalPostAnalytics(_id=0, created_posts=0)
-
-        global_analytics.created_posts += 1
-        global_analytics.save()
-
-        _id = id_generator(16, global_analytics.created_posts)
+        _id = _new_post_id()
 
         _source = None
         if source is not None:
@@ -1376,12 +1357,12 @@ async def add_venue(user_model: User = None, user_id: int = None,
             venue_post.foursquare_type = foursquare_type
 
         if venue_post.is_valid():
-            save = to_async(venue_post.save)
-            await save(full_clean=True)
+            if commit:
+                save = to_async(venue_post.save, MONGO_WRITE)
+                await save(full_clean=True)
 
-            global_analytics.added_posts += 1
-            global_analytics.save()
-            __POST_CACHE[venue_post.post_id] = venue_post
+                analytics_controllers.count('added_posts')
+                _register_new_post(venue_post)
 
         else:
             raise venue_post.full_clean()
@@ -1396,27 +1377,25 @@ async def add_venue(user_model: User = None, user_id: int = None,
 
 async def remove_post(post_model: PostModel = None, post_id: str = None)-> bool:
     """
-    Remove a post, and all it's associated comments from the database, by setting the deleted flag.
+    Remove a post, and all it's associated comments from the database, by setting the deleted flag. Only the deleted
+    flag and date of the post are written, so other fields changed since `post_model` was read are kept.
     :param post_model: The model instance of a post on the database
     :param post_id: The identifier of a post on the database. Used only if `post_model` is None
-    :return: True if deleted, False if the post was never added, or the Exception raised by the data validation
-             (less likely to happen).
+    :return: True if deleted, False if the post was never added
     """
     try:
         post = post_model if post_model is not None else await get_posts(post_id=post_id)
-        post.is_deleted = True
-        post.deleted_date = datetime.datetime.utcnow()
-        raw = to_async(Comment.objects.raw)
+        now = datetime.datetime.utcnow()
+        raw = to_async(Comment.objects.raw, inline=True)
         _comments = await raw({'postReference': post.post_id})
-        if post.is_valid():
-            update = to_async(_comments.update)
-            await update({'$set': {'deletedDate': datetime.datetime.utcnow(), 'isDeleted': True}})
-            save = to_async(post.save)
-            await save(full_clean=True)
-            del __POST_CACHE[post.post_id]
-            return True
-        else:
-            raise post.full_clean()
+        update = to_async(_comments.update, MONGO_WRITE)
+        await update({'$set': {'deletedDate': now, 'isDeleted': True}})
+        await async_db.update_one(PostModel, {'_id': post.post_id}, {'$set': {'isDeleted': True, 'deletedDate': now}})
+        post.is_deleted = True
+        post.deleted_date = now
+        del __POST_CACHE[post.post_id]
+        __POST_MISSES[post.post_id] = True
+        return True
     except PostModel.DoesNotExist:
         return False
 
@@ -1430,16 +1409,22 @@ async def get_posts(post_id: str = None, post_ids: List[str] = None)-> Union[Pos
              None, or there are no database matches.
     """
     try:
-        get = to_async(PostModel.objects.get)
-        raw = to_async(PostModel.objects.raw)
+        raw = to_async(PostModel.objects.raw, inline=True)
         if post_id is not None:
             posts = __POST_CACHE[post_id]
             if posts is None:
-                posts = await get({'postId': post_id, 'isDeleted': False})
+                if _known_missing(post_id):
+                    raise PostModel.DoesNotExist
+                try:
+                    posts = await __POST_FLIGHTS.do(post_id, async_db.find_one, PostModel,
+                                                    {'postId': post_id, 'isDeleted': False})
+                except PostModel.DoesNotExist:
+                    _mark_missing(post_id)
+                    raise
+                __POST_CACHE[post_id] = posts
         elif post_ids is not None:
             posts = await raw({'postId': {'$in': post_ids}, 'isDeleted': False})
-            for post in posts:
-                __POST_CACHE[post.post_id] = post
+            __POST_CACHE.set_many({post.post_id: post for post in posts})
         else:
             raise PostModel.DoesNotExist
         return posts
@@ -1447,6 +1432,301 @@ async def get_posts(post_id: str = None, post_ids: List[str] = None)-> Union[Pos
         raise
 
 
+def cached_post(post_id: str)-> Union[PostModel, None]:
+    """
+    Gets a post only if it is cached by this process, without reaching the database. The instance is shared: changes
+    made to it are seen by every later read from the cache.
+    :param post_id: The identifier of a post on the database
+    :return: The cached [PostModel] instance, or None
+    """
+    return __POST_CACHE[post_id]
+
+
+def cached_posts(post_ids: Iterable[str])-> Dict[str, PostModel]:
+    """
+    Gets the posts cached by this process among many IDs, without reaching the database.
+    :param post_ids: Identifiers of posts on the database
+    :return: Dict mapping the IDs cached to their [PostModel] instances
+    """
+    return __POST_CACHE.get_many(post_ids)
+
+
+def invalidate_post(post_id: str)-> None:
+    """
+    Removes a post from the cache of this process, so it is read again from the database on the next lookup.
+    :param post_id: The identifier of a post on the database
+    """
+    __POST_CACHE.pop(post_id)
+
+
+async def get_post_document(post_id: str)-> dict:
+    """
+    Gets a single post as a raw document, ready for the serializers of `post_serializers`. A post already cached is
+    answered from the cache; otherwise the post is read with no model instance, and without the fields only used
+    internally.
+    :param post_id: The identifier of a post on the database
+    :return: The raw post document
+    """
+    post = __POST_CACHE[post_id]
+    if post is not None:
+        return post.to_son()
+    if _known_missing(post_id):
+        raise PostModel.DoesNotExist
+    collection = async_db.fast_collection(PostModel)
+    document = await __POST_FLIGHTS.do(('document', post_id), collection.find_one,
+                                       {'postId': post_id, 'isDeleted': False},
+                                       {'isDeleted': 0, 'deletedDate': 0})
+    if document is None:
+        _mark_missing(post_id)
+        raise PostModel.DoesNotExist
+    return document
+
+
+async def get_post_documents(post_ids: List[str])-> List[dict]:
+    """
+    Gets posts as raw documents, ready for the serializers of `post_serializers`, in the same order of `post_ids`.
+    Cached posts are taken from the cache; only the others are read, with no model instances.
+    :param post_ids: A list of identifiers of posts in the database
+    :return: List of raw post documents. Posts that don't exist are left out
+    """
+    documents = {post_id: post.to_son() for post_id, post in __POST_CACHE.get_many(post_ids).items()}
+    missing = [post_id for post_id in post_ids if post_id not in documents]
+    if missing:
+        found = await async_db.find_documents(PostModel, {'postId': {'$in': missing}, 'isDeleted': False},
+                                              {'isDeleted': 0, 'deletedDate': 0})
+        documents.update((document['postId'], document) for document in found)
+    return [documents[post_id] for post_id in post_ids if post_id in documents]
+
+
+async def get_post_group_page(group_hash: str, cursor: str = None, skip: int = 0,
+                              limit: int = 30)-> Tuple[Posts, List[dict], Union[str, None]]:
+    """
+    Gets a page of the posts of a group, in the order of the group. The ordered list of the group is sliced first, so
+    only the posts of the page are read. A group not yet cached is read together with its page, in a single
+    aggregation; a cached group only needs its posts that are not cached.
+    :param group_hash: The identifier of the post group
+    :param cursor: (Optional) The cursor returned with the previous page. Takes precedence over `skip`
+    :param skip: Quantity of posts of the group to be skipped
+    :param limit: Maximum quantity of posts in the page
+    :return: Tuple of the [Posts] group, the list of raw post documents, and the cursor of the next page (None if this
+             is the last one). Raises ValueError if the cursor is malformed
+    """
+    # The cursor keeps the last post of the page: if posts before it leave the group, the next page still starts right
+    # after it. The offset is only used if the post itself left the group.
+    offset, last_post_id = skip, None
+    if cursor is not None:
+        offset, last_post_id = decode_cursor(cursor, 2)
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError('Malformed cursor.')
+
+    group = __POST_GROUP_CACHE[group_hash]
+    if group is None:
+        group, start, documents = await _get_post_group_with_page(group_hash, offset, last_post_id, limit)
+        page_ids = group.posts[start:start + limit]
+    else:
+        start = offset
+        if last_post_id is not None and last_post_id in group.posts:
+            start = group.posts.index(last_post_id) + 1
+        page_ids = group.posts[start:start + limit]
+        documents = await get_post_documents(page_ids)
+
+    end = start + len(page_ids)
+    next_cursor = encode_cursor(end, page_ids[-1]) if page_ids and end < len(group.posts) else None
+    return group, documents, next_cursor
+
+
+async def _get_post_group_with_page(group_hash: str, offset: int, last_post_id: Union[str, None],
+                                    limit: int)-> Tuple[Posts, int, List[dict]]:
+    """
+    Reads a group and a page of its posts in a single aggregation: the page is sliced from the group, and its posts are
+    joined with `$lookup` on the `postIdIndex`. The group is cached, like `get_post_group` does.
+    :param group_hash: The identifier of the post group
+    :param offset: Position of the first post of the page, if `last_post_id` is None or no longer in the group
+    :param last_post_id: (Optional) The last post of the previous page
+    :param limit: Maximum quantity of posts in the page
+    :return: Tuple of the [Posts] group, the position of the first post of the page, and the list of raw post
+             documents, in the order of the group
+    """
+    start = offset
+    if last_post_id is not None:
+        index = {'$indexOfArray': ['$posts', last_post_id]}
+        start = {'$cond': [{'$gte': [index, 0]}, {'$add': [index, 1]}, offset]}
+
+    result = await async_db.aggregate(Posts, [
+        {'$match': {'groupHash': group_hash}},
+        {'$limit': 1},
+        {'$addFields': {'pageStart': start}},
+        {'$addFields': {'pageIds': {'$slice': ['$posts', '$pageStart', limit]}}},
+        {'$lookup': {'from': PostModel._mongometa.collection_name, 'localField': 'pageIds',
+                     'foreignField': 'postId', 'as': 'pageDocuments'}},
+    ])
+    if not result:
+        raise Posts.DoesNotExist
+    document = result[0]
+    start = document.pop('pageStart')
+    page_ids = document.pop('pageIds')
+    found = {}
+    for post in document.pop('pageDocuments'):
+        if not post.get('isDeleted', False):
+            for internal in ('isDeleted', 'deletedDate'):
+                post.pop(internal, None)
+            found[post['postId']] = post
+
+    group = Posts.from_document(document)
+    __POST_GROUP_CACHE[group_hash] = group
+    return group, start, [found[post_id] for post_id in page_ids if post_id in found]
+
+
+async def get_channel_post_documents(channel_id: int, cursor: str = None,
+                                     limit: int = 30)-> Tuple[List[dict], Union[str, None]]:
+    """
+    Gets a page of the posts of a channel, newest first, as raw documents. Pages are keyset paginated on
+    (`createdDate`, `_id`) through the `postChannelFeedIndex`, so every page costs the same, however deep it is.
+    :param channel_id: The Telegram's ID of the channel
+    :param cursor: (Optional) The cursor returned with the previous page. None for the first page
+    :param limit: Maximum quantity of posts in the page
+    :return: Tuple of the list of raw post documents, and the cursor of the next page (None if this is the last one).
+             Raises ValueError if the cursor is malformed
+    """
+    query = {'channelId': channel_id, 'isDeleted': False}
+    if cursor is not None:
+        created_date, _id = decode_cursor(cursor, 2)
+        if not isinstance(created_date, datetime.datetime) or not isinstance(_id, str):
+            raise ValueError('Malformed cursor.')
+        query['$or'] = [{'createdDate': {'$lt': created_date}},
+                        {'createdDate': created_date, '_id': {'$lt': _id}}]
+
+    # One extra post tells if there is a next page
+    documents = await async_db.find_documents(PostModel, query, {'isDeleted': 0, 'deletedDate': 0},
+                                              sort=[('createdDate', -1), ('_id', -1)], limit=limit + 1)
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last['createdDate'], last['_id'])
+    return documents, next_cursor
+
+
+async def build_post_id_filter(error_rate: float = 0.01)-> int:
+    """
+    Builds the filter of known post IDs from the `postIdIndex`, so that lookups of unknown IDs are answered without
+    reaching the database. Posts added afterwards by this process are added to the filter; posts added by other
+    processes are not, so with more than one worker the filter must be rebuilt periodically.
+    :param error_rate: Desired false positive probability of the filter
+    :return: Quantity of post IDs in the filter
+    """
+    global __POST_ID_FILTER, __POST_ID_FILTER_DATE
+    # Posts added while the index is scanned may be missed too
+    started = datetime.datetime.utcnow()
+
+    def _scan()-> BloomFilter:
+        collection = PostModel._mongometa.collection
+        # Twice the current size, so the error rate holds while new posts are added
+        capacity = max(1024 * 1024, collection.estimated_document_count() * 2)
+        bloom = BloomFilter(capacity=capacity, error_rate=error_rate)
+        # Covered query: only reads the index
+        cursor = collection.find({'postId': {'$exists': True}}, {'_id': 0, 'postId': 1}).hint('postIdIndex')
+        for document in cursor:
+            bloom.add(document['postId'])
+        return bloom
+
+    scan = to_async(_scan)
+    __POST_ID_FILTER = await scan()
+    __POST_ID_FILTER_DATE = started
+    return len(__POST_ID_FILTER)
+
+
+async def migrate_post_indexes()-> List[str]:
+    """
+    Replaces the indexes of the posts collection left by previous versions, whose options conflict with the ones now
+    declared in [PostModel] (the unique `postGroupHashIndex` on `groupHash` became the non-unique `postGroupIndex`).
+    Must run before serving, as the conflicting index makes the creation of the indexes fail when the collection is
+    first used.
+    :return: Names of the indexes dropped
+    """
+    dropped = await async_db.drop_indexes(PostModel, __LEGACY_POST_INDEXES)
+    await async_db.create_indexes(PostModel)
+    return dropped
+
+
+def _issued_after(post_id: str, date: datetime.datetime)-> bool:
+    """
+    :param post_id: The identifier of a post
+    :param date: UTC datetime
+    :return: True if the ID was issued by `ids` after `date`, and not in the future, give or take `__ID_CLOCK_SKEW`.
+             False for IDs not made by `ids`, including forged IDs that decode to a future date
+    """
+    try:
+        created_date = IdAllocator.created_date(post_id)
+    except (ValueError, OverflowError, OSError):
+        return False
+    return date - __ID_CLOCK_SKEW < created_date <= datetime.datetime.utcnow() + __ID_CLOCK_SKEW
+
+
+def _known_missing(post_id: str)-> bool:
+    """
+    Tells, without reaching the database, if a post surely doesn't exist: it was recently missed, or the filter of known
+    IDs doesn't have it and the ID is older than the filter.
+    :param post_id: The identifier of a post
+    :return: True if the post doesn't exist; False if it must be looked up
+    """
+    if __POST_MISSES[post_id] is not None:
+        return True
+    return __POST_ID_FILTER is not None and post_id not in __POST_ID_FILTER and \
+        not _issued_after(post_id, __POST_ID_FILTER_DATE)
+
+
+def _mark_missing(post_id: str)-> None:
+    """
+    Remembers a post ID that was looked up and not found. IDs issued just now are not remembered: their post may still
+    be being added by another process.
+    :param post_id: The identifier of a post
+    """
+    if not _issued_after(post_id, datetime.datetime.utcnow()):
+        __POST_MISSES[post_id] = True
+
+
+def _new_post_id()-> str:
+    """
+    Issues the ID of a new post. The post is only counted as created once it is added, by `_register_new_post`.
+    :return: The ID
+    """
+    return ids.next_id()
+
+
+def _register_new_post(post: PostModel)-> None:
+    """
+    Counts a post just added to the database as created, caches it, and marks its ID as known. Only called once the
+    post was written.
+    :param post: The post added
+    """
+    analytics_controllers.count('created_posts')
+    __POST_CACHE[post.post_id] = post
+    __POST_MISSES.pop(post.post_id)
+    if __POST_ID_FILTER is not None:
+        __POST_ID_FILTER.add(post.post_id)
+
+
+def _create_post_group(posts: List[PostModel], creator: User, channel: Channel)-> Posts:
+    """
+    Helper to create the group of posts. The group is identified by the hash of the IDs of its posts.
+    :param posts: Posts of the group
+    :param creator: Creator of the posts
+    :param channel: Channel to where the posts belongs
+    :return: [Posts] object of the group, not yet saved
+    """
+    post_strings = [post.post_id for post in posts]
+    posts_hash = hash_generator(''.join(post_strings))
+    return Posts(
+        _id=posts_hash,
+        posts_hash=posts_hash,
+        creator=creator,
+        channel=channel,
+        date_created=datetime.datetime.utcnow(),
+        posts=post_strings
+    )
+
+
 def _create_link(link_map: Dict[str, str]) -> Union[Link, None]:
     """
     Helper to create links
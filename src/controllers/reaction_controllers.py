@@ -23,14 +23,27 @@
 
 from ..models.user_models import User
 from ..models.post_models import PostModel
-from ..utils.function_handlers import to_async, temp_lru_cache
+from ..utils.function_handlers import temp_lru_cache
 from ..models.reactions_model import Reaction, ReactionObj, UserReaction
-from typing import List, Union, Dict
+from ..models import async_db
+from ..models.config import REACTION_FLUSH_INTERVAL, MAX_REACTION_STATES, RECONCILE_CHUNK_SIZE, \
+    RECONCILE_CONCURRENCY, RECONCILE_SETTLE_TIME
+from pymongo import UpdateOne, DeleteMany
+from pymongo.errors import DuplicateKeyError, BulkWriteError, ServerSelectionTimeoutError
+from typing import List, Union, Dict, Tuple
+import asyncio
 import datetime
+import logging
+import time
 from functools import lru_cache
 
 
-__CACHE = temp_lru_cache(max_size=4096)
+__LOGGER = logging.getLogger(__name__)
+__CACHE = temp_lru_cache(max_size=4096, ttl=60*5)
+# Reaction counter deltas not yet written, as {post_id: {reaction_index: delta}}
+__REACTION_DELTAS: Dict[str, Dict[int, int]] = {}
+# Posts whose reaction change time was recently stamped by this process
+__REACTION_STAMPS = temp_lru_cache(max_size=16384, ttl=RECONCILE_SETTLE_TIME / 2)
 
 
 @lru_cache(maxsize=2048)
@@ -73,10 +86,145 @@ def create_reaction(reactions_list: List[str] = None,
     return _reactions
 
 
+def count_reaction(post_id: str, index: int, amount: int)-> None:
+    """
+    Buffers a change of a reaction counter of a post. The post cached is changed right away, so reads see the new count;
+    the database only gets it on the next `flush_reactions`.
+    :param post_id: The identifier of the post
+    :param index: The index of the reaction emoji
+    :param amount: Quantity to be added to the counter (negative to subtract)
+    """
+    from .post_controllers import cached_post
+    deltas = __REACTION_DELTAS.setdefault(post_id, {})
+    deltas[index] = deltas.get(index, 0) + amount
+
+    post = cached_post(post_id)
+    if post is not None and post.reactions is not None and index < len(post.reactions.reactions):
+        reaction = post.reactions.reactions[index]
+        reaction.count = max(0, reaction.count + amount)
+        post.reactions.total_count = max(0, post.reactions.total_count + amount)
+        post.reactions_changed_date = datetime.datetime.utcnow()
+
+
+async def _stamp_reaction_change(post_id: str)-> None:
+    """
+    Records on a post that its reactions are about to change, so `reconcile_reaction_counts` leaves it alone while the
+    change may still be buffered. Must be awaited before the [UserReaction] is changed. Each process writes the stamp of
+    a post at most once every half of `RECONCILE_SETTLE_TIME`.
+    :param post_id: The identifier of the post
+    """
+    if __REACTION_STAMPS[post_id] is not None:
+        return
+    await async_db.update_one(PostModel, {'postId': post_id},
+                              {'$max': {'reactionsChangedDate': datetime.datetime.utcnow()}})
+    __REACTION_STAMPS[post_id] = True
+
+
+async def flush_reactions()-> int:
+    """
+    Writes the buffered reaction deltas: one `$inc` per post, on the counters of its reactions and on the total, all
+    sent with a single `bulk_write`. Deltas are kept for the next flush only if their write surely did not happen: the
+    operations rejected in a `BulkWriteError`, or every one if no server was reachable. When the outcome is unknown
+    (network errors, cancellation) or the writes landed (write concern errors), the deltas are dropped instead of
+    risking counting them twice; `reconcile_reaction_counts` repairs the counters.
+    :return: Quantity of posts written
+    """
+    global __REACTION_DELTAS
+    if not __REACTION_DELTAS:
+        return 0
+
+    deltas, __REACTION_DELTAS = __REACTION_DELTAS, {}
+    now = datetime.datetime.utcnow()
+    requests, post_ids = [], []
+    for post_id, counts in deltas.items():
+        increments = {f'reactions.reactions.{index}.count': amount for index, amount in counts.items() if amount}
+        if increments:
+            increments['reactions.totalCount'] = sum(counts.values())
+            requests.append(UpdateOne({'postId': post_id}, {'$inc': increments,
+                                                            '$max': {'reactionsChangedDate': now}}))
+            post_ids.append(post_id)
+    if not requests:
+        return 0
+
+    try:
+        await async_db.bulk_write(PostModel, requests)
+    except BulkWriteError as exc:
+        # Unordered: every operation but the ones listed was applied
+        _restore_deltas({post_ids[error['index']]: deltas[post_ids[error['index']]]
+                         for error in exc.details.get('writeErrors', ())})
+        raise
+    except ServerSelectionTimeoutError:
+        _restore_deltas(deltas)
+        raise
+    return len(requests)
+
+
+def _restore_deltas(deltas: Dict[str, Dict[int, int]])-> None:
+    """
+    Puts back reaction deltas that were not written, adding them to the ones buffered meanwhile.
+    """
+    for post_id, counts in deltas.items():
+        _deltas = __REACTION_DELTAS.setdefault(post_id, {})
+        for index, amount in counts.items():
+            _deltas[index] = _deltas.get(index, 0) + amount
+
+
+async def run_reaction_flusher(interval: float = REACTION_FLUSH_INTERVAL)-> None:
+    """
+    Flushes the buffered reaction deltas every `interval` seconds, forever.
+    :param interval: Seconds between flushes
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_reactions()
+        except Exception:
+            # Deltas not written are kept, and retried on the next round
+            __LOGGER.exception('Failed to flush the reaction counters')
+
+
+async def toggle_user_reaction(user_id: int, post_id: str, index: int)-> Tuple[Union[int, None], Union[int, None]]:
+    """
+    Atomically toggles the reaction of a user on a post, and buffers the counter changes it makes. Relies on the unique
+    `userReactionUserPostIndex`: the reaction is upserted with a single `find_one_and_update`, and the counters are
+    derived from the reaction it replaced. Reacting again with the same index removes the reaction.
+    :param user_id: Telegram's user ID
+    :param post_id: The identifier of the post
+    :param index: The index of the reaction emoji the user reacted
+    :return: Tuple of the previous and the new reaction index of the user. None means no reaction.
+    """
+    await _stamp_reaction_change(post_id)
+    now = datetime.datetime.utcnow()
+    query = {'userId': user_id, 'postId': post_id}
+    # pymodm filters its queries on [UserReaction] by `_cls`, so inserted reactions must carry it
+    update = {'$set': {'reactionIndex': index, 'reactionDate': now},
+              '$setOnInsert': {'_cls': UserReaction._mongometa.object_name}}
+    try:
+        previous = await async_db.find_one_and_update(UserReaction, query, update, upsert=True,
+                                                      projection={'reactionIndex': 1}, return_new=False)
+    except DuplicateKeyError:
+        # A concurrent tap inserted the reaction first: this one is now an update
+        previous = await async_db.find_one_and_update(UserReaction, query, update, upsert=True,
+                                                      projection={'reactionIndex': 1}, return_new=False)
+
+    old_index = previous['reactionIndex'] if previous is not None else None
+    if old_index == index:
+        # Same reaction again: removes it, unless another tap changed it meanwhile
+        if await async_db.delete_one(UserReaction, dict(query, reactionIndex=index, reactionDate=now)):
+            count_reaction(post_id, index, -1)
+            return old_index, None
+        return old_index, index
+
+    if old_index is not None:
+        count_reaction(post_id, old_index, -1)
+    count_reaction(post_id, index, 1)
+    return old_index, index
+
+
 async def user_reaction(user_model: User = None, user_id: int = None, *,
                         post_id: str, index: int)-> Union[UserReaction, None]:
     """
-    Adds or edits a user reaction in the database.
+    Adds or edits a user reaction in the database. Reacting again with the same index removes the reaction.
     :param user_model: user reference model to identify the reaction.
     :param user_id: Telegram's user ID. Used only if `user_model` is None
     :param post_id: The identifier of the post
@@ -84,48 +232,22 @@ async def user_reaction(user_model: User = None, user_id: int = None, *,
     :return: [UserReaction] instance or None proving the success of the transaction. If None, it means the reaction
              was simply removed.
     """
-    from .post_controllers import get_posts, __POST_CACHE
+    from .post_controllers import get_posts
     try:
         user = user_model.uid if user_model is not None else user_id
         post = await get_posts(post_id=post_id)
-        if post.reactions is None:
+        if post.reactions is None or not 0 <= index < len(post.reactions.reactions):
             raise IndexError('')
-        now = datetime.datetime.utcnow()
-        get = to_async(UserReaction.objects.get)
-        try:
-            _usr_reaction = await get({'userId': user, 'postId': post.post_id})
-            _old_index = _usr_reaction.reaction_index
-            _usr_reaction.reaction_index = index
-            _usr_reaction.reaction_date = now
-            post.reactions.reactions[_old_index] -= 1
-            post.reactions.total_count -= 1
-            if index == _old_index:
-                post.save()
-                await remove_user_reaction(user_id=_usr_reaction.user_id, post_id=_usr_reaction.post)
-                return None
-        except UserReaction.DoesNotExist:
-            _usr_reaction = UserReaction(
-                user_id=user,
-                post=post,
-                reaction_index=index,
-                reaction_date=now
-            )
-        except IndexError:
-            raise
-        if _usr_reaction.is_valid():
-            try:
-                post.reactions.reactions[index] += 1
-                post.reactions.total_count += 1
-                reaction_save = to_async(_usr_reaction.save)
-                await reaction_save(full_clean=True)
-                save_post = to_async(post.save)
-                await save_post()
-                __POST_CACHE[post.post_id] = post
-                return _usr_reaction
-            except IndexError:
-                raise
-        else:
-            raise _usr_reaction.full_clean()
+
+        _, new_index = await toggle_user_reaction(user, post.post_id, index)
+        if new_index is None:
+            return None
+        return UserReaction(
+            user_id=user,
+            post=post,
+            reaction_index=new_index,
+            reaction_date=datetime.datetime.utcnow()
+        )
 
     except PostModel.DoesNotExist:
         raise
@@ -142,17 +264,197 @@ async def remove_user_reaction(user_model: User = None, user_id: int = None, *,
     :return: True if deleted, False if the user was never added, or the Exception raised by the data validation
              (less likely to happen).
     """
-    from .post_controllers import get_posts
-    try:
-        user = user_model.uid if user_model is not None else user_id
-        post = await get_posts(post_id=post_id)
-        save = to_async(post.save)
-        _usr_reaction = UserReaction.objects.get({'userId': user, 'postId': post_id})
-        delete = to_async(_usr_reaction.delete)
-        post.reactions.reactions[_usr_reaction.reaction_index] -= 1
-        post.reactions.total_count -= 1
-        await save()
-        await delete()
-        return True
-    except UserReaction.DoesNotExist:
+    user = user_model.uid if user_model is not None else user_id
+    await _stamp_reaction_change(post_id)
+    removed = await async_db.find_one_and_delete(UserReaction, {'userId': user, 'postId': post_id},
+                                                 projection={'reactionIndex': 1})
+    if removed is None:
         return False
+    count_reaction(post_id, removed['reactionIndex'], -1)
+    return True
+
+
+def _buffered_counts(post_id: str, reactions: List[dict], total_count: int)-> Tuple[List[dict], int]:
+    """
+    Adds the deltas not yet flushed to counters read from the database.
+    """
+    deltas = __REACTION_DELTAS.get(post_id, None)
+    if not deltas:
+        return reactions, total_count
+    for index, amount in deltas.items():
+        if index < len(reactions):
+            reactions[index]['count'] = max(0, reactions[index]['count'] + amount)
+    return reactions, max(0, total_count + sum(deltas.values()))
+
+
+async def get_reaction_states(user_id: int, post_ids: List[str])-> Dict[str, dict]:
+    """
+    Gets the reaction counters of many posts, and the reaction a user picked on each of them. Counters come from the
+    post cache, and only the posts not cached are read; the reactions of the user come from a single `$in` query on
+    the `userReactionUserPostIndex`. Both reads run concurrently.
+    :param user_id: Telegram's user ID
+    :param post_ids: The identifiers of the posts. At most `MAX_REACTION_STATES`
+    :return: Dict mapping each post that exists to a dict with its `reactions` (list of `emoji` and `count`),
+             `total_count` and the `user_reaction` index (None if the user didn't react)
+    """
+    from .post_controllers import cached_posts
+    if len(post_ids) > MAX_REACTION_STATES:
+        raise ValueError(f'At most {MAX_REACTION_STATES} posts are allowed.')
+
+    states = {}
+    for post_id, post in cached_posts(post_ids).items():
+        reactions = post.reactions
+        states[post_id] = {
+            'reactions': [] if reactions is None else [{'emoji': i.emoji, 'count': i.count}
+                                                       for i in reactions.reactions],
+            'total_count': 0 if reactions is None else reactions.total_count,
+            'user_reaction': None,
+        }
+    missing = [post_id for post_id in post_ids if post_id not in states]
+
+    async def read_missing()-> List[dict]:
+        if not missing:
+            return []
+        return await async_db.find_documents(PostModel, {'postId': {'$in': missing}, 'isDeleted': False},
+                                             {'_id': 0, 'postId': 1, 'reactions': 1})
+
+    documents, user_reactions = await asyncio.gather(
+        read_missing(),
+        async_db.find_documents(UserReaction, {'userId': user_id, 'postId': {'$in': post_ids}},
+                                {'_id': 0, 'postId': 1, 'reactionIndex': 1}))
+
+    for document in documents:
+        reactions = document.get('reactions', None) or {}
+        counts = [{'emoji': i.get('emoji'), 'count': i.get('count', 0)} for i in reactions.get('reactions', None) or ()]
+        counts, total_count = _buffered_counts(document['postId'], counts, reactions.get('totalCount', 0))
+        states[document['postId']] = {'reactions': counts, 'total_count': total_count, 'user_reaction': None}
+    for user_reaction_document in user_reactions:
+        state = states.get(user_reaction_document['postId'], None)
+        if state is not None:
+            state['user_reaction'] = user_reaction_document['reactionIndex']
+    return states
+
+
+async def _reconcile_chunk(post_ids: List[str], stats: dict, dry_run: bool)-> None:
+    """
+    Recomputes the reaction counters of a chunk of posts from their [UserReaction] documents, and writes the ones that
+    drifted. The posts are read after the reactions are counted: any reaction change the count sees was stamped on its
+    post beforehand, so posts with a recent stamp are skipped. Each write only matches if the counters still
+    hold the values read, so concurrent increments are never overwritten: those posts are left for the next run.
+    """
+    groups = await async_db.aggregate(UserReaction, [
+        {'$match': {'postId': {'$in': post_ids}}},
+        {'$group': {'_id': {'postId': '$postId', 'index': '$reactionIndex'}, 'count': {'$sum': 1}}},
+    ])
+    posts = await async_db.find_documents(PostModel, {'_id': {'$in': post_ids}},
+                                          {'_id': 1, 'reactions': 1, 'reactionsChangedDate': 1})
+
+    counted: Dict[str, Dict[int, int]] = {}
+    for group in groups:
+        counted.setdefault(group['_id']['postId'], {})[group['_id']['index']] = group['count']
+
+    settled = datetime.datetime.utcnow() - datetime.timedelta(seconds=RECONCILE_SETTLE_TIME)
+    requests = []
+    for post in posts:
+        post_id = post['_id']
+        stats['scanned'] += 1
+        changed_date = post.get('reactionsChangedDate', None)
+        if post.get('reactions', None) is None or (changed_date is not None and changed_date > settled):
+            stats['skipped'] += 1
+            continue
+
+        reactions = post['reactions'].get('reactions', None) or ()
+        stored = [reaction.get('count', 0) for reaction in reactions]
+        stored_total = post['reactions'].get('totalCount', 0)
+        actual = [counted.get(post_id, {}).get(index, 0) for index in range(len(stored))]
+        if actual == stored and sum(actual) == stored_total:
+            continue
+
+        drift = sum(abs(a - b) for a, b in zip(actual, stored))
+        stats['drifted'] += 1
+        stats['drift'] += drift
+        stats['max_drift'] = max(stats['max_drift'], drift, abs(sum(actual) - stored_total))
+
+        query = {'_id': post_id, 'reactions.totalCount': stored_total,
+                 'reactionsChangedDate': changed_date}
+        update = {'reactions.totalCount': sum(actual)}
+        for index, count in enumerate(stored):
+            query[f'reactions.reactions.{index}.count'] = count
+            update[f'reactions.reactions.{index}.count'] = actual[index]
+        requests.append(UpdateOne(query, {'$set': update}))
+
+    if requests and not dry_run:
+        result = await async_db.bulk_write(PostModel, requests)
+        stats['fixed'] += result.modified_count
+
+
+async def reconcile_reaction_counts(chunk_size: int = RECONCILE_CHUNK_SIZE, concurrency: int = RECONCILE_CONCURRENCY,
+                                    *, dry_run: bool = False)-> dict:
+    """
+    Fixes the reaction counters of every post that drifted from the [UserReaction] documents. Posts are read in chunks,
+    paginated by `_id`, and each chunk is counted with a single aggregation grouped by post and reaction index; at most
+    `concurrency` chunks are counted at once. Safe to run while serving: posts whose reactions changed within the last
+    `RECONCILE_SETTLE_TIME` seconds, by the `reactionsChangedDate` every worker stamps before changing a reaction, are
+    skipped, and the counters are only replaced if they did not change since they were read.
+    Posts fixed are not removed from the caches of the serving workers, which keep the old counters until they expire.
+    :param chunk_size: Quantity of posts counted by each aggregation
+    :param concurrency: Maximum quantity of chunks being counted at the same time
+    :param dry_run: If True, only reports the drift, writing nothing
+    :return: Dict of statistics: posts `scanned`, `skipped`, `drifted` and `fixed`, the total and maximum `drift` of
+             the counters, the `elapsed` seconds and the `posts_per_second`
+    """
+    stats = {'scanned': 0, 'skipped': 0, 'drifted': 0, 'fixed': 0, 'drift': 0, 'max_drift': 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+    start = time.monotonic()
+
+    async def run(post_ids: List[str]):
+        try:
+            await _reconcile_chunk(post_ids, stats, dry_run)
+        finally:
+            semaphore.release()
+
+    last_id = None
+    while True:
+        query = {'reactions': {'$ne': None}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        posts = await async_db.find_documents(PostModel, query, {'_id': 1}, sort=[('_id', 1)], limit=chunk_size)
+        if not posts:
+            break
+        last_id = posts[-1]['_id']
+        await semaphore.acquire()
+        tasks.append(asyncio.ensure_future(run([post['_id'] for post in posts])))
+
+    await asyncio.gather(*tasks)
+    stats['elapsed'] = time.monotonic() - start
+    stats['posts_per_second'] = stats['scanned'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
+
+
+async def dedup_user_reactions(chunk_size: int = RECONCILE_CHUNK_SIZE)-> dict:
+    """
+    Removes the duplicated [UserReaction] documents of each user and post, keeping the newest by `reactionDate`, and
+    creates the indexes of [UserReaction], so that the unique `userReactionUserPostIndex` can be built on databases
+    written by previous versions. Must run before serving; the reaction counters of the posts still count the removed
+    reactions, so `reconcile_reaction_counts` must run afterwards.
+    :param chunk_size: Quantity of duplicated pairs removed with each bulk write
+    :return: Dict of statistics: duplicated `pairs` found and reactions `deleted`
+    """
+    pairs = await async_db.aggregate(UserReaction, [
+        {'$sort': {'reactionDate': -1, '_id': -1}},
+        {'$group': {'_id': {'userId': '$userId', 'postId': '$postId'}, 'keep': {'$first': '$_id'},
+                    'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+    ], allow_disk_use=True)
+
+    stats = {'pairs': len(pairs), 'deleted': 0}
+    for start in range(0, len(pairs), chunk_size):
+        requests = [DeleteMany({'userId': pair['_id']['userId'], 'postId': pair['_id']['postId'],
+                                '_id': {'$ne': pair['keep']}})
+                    for pair in pairs[start:start + chunk_size]]
+        result = await async_db.bulk_write(UserReaction, requests)
+        stats['deleted'] += result.deleted_count
+
+    await async_db.create_indexes(UserReaction)
+    return stats
@@ -22,9 +22,11 @@
 #
 
 from ..models.user_models import User, Bot
-from ..utils.function_handlers import to_async
+from ..models import async_db
+from ..utils.function_handlers import to_async, single_flight
+from ..utils.executors import MONGO_WRITE
 import datetime
-from typing import Union, List, Iterable
+from typing import Dict, Union, List, Iterable
 import bcrypt
 
 
@@ -36,6 +38,10 @@ class BotAlreadyAdded(BaseException):
     pass
 
 
+__USER_FLIGHTS = single_flight('users')
+__BOT_FLIGHTS = single_flight('bots')
+
+
 async def add_user(user_id: int, password_hash: str, *, first_name: str = None, last_name: str = None,
                    username: str = None, profile_photo: str = None, profile_thumb: str = None)-> User:
     """
@@ -55,7 +61,8 @@ async def add_user(user_id: int, password_hash: str, *, first_name: str = None,
         get = to_async(User.objects.get)
         user = await get({'userId': user_id})
         if user.is_deleted:
-            User.objects.raw({'userId': user_id}).update({'$set': {'isDeleted': False}, '$unset': {'deletedDate': ''}})
+            await async_db.update_many(User, {'userId': user_id},
+                                       {'$set': {'isDeleted': False}, '$unset': {'deletedDate': ''}})
             user = await get_users(user_id=user_id)
             return await edit_user_info(user_model=user, new_password_hash=password_hash,
                                         first_name=first_name, last_name=last_name, username=username)
@@ -82,7 +89,7 @@ async def add_user(user_id: int, password_hash: str, *, first_name: str = None,
             user.profile_photo = profile_photo
             user.profile_thumbnail = profile_thumb
         if user.is_valid():
-            save = to_async(user.save)
+            save = to_async(user.save, MONGO_WRITE)
             await save(full_clean=True)
             return user
         else:
@@ -110,8 +117,8 @@ async def add_bot(bot_id: int, bot_token: str, *, user_model: User = None, user_
         get = to_async(Bot.objects.get)
         bot = await get({'$or': [{'botId': bot_id}, {'botToken': bot_token}]})
         if bot.is_deleted:
-            Bot.objects.raw({'$or': [{'botId': bot_id}, {'botToken': bot_token}]})\
-                .update({'$set': {'isDeleted': False}, '$unset': {'deletedDate': ''}})
+            await async_db.update_many(Bot, {'$or': [{'botId': bot_id}, {'botToken': bot_token}]},
+                                       {'$set': {'isDeleted': False}, '$unset': {'deletedDate': ''}})
             return await edit_bot_info(bot_id=bot_id, bot_token=bot_token, bot_name=bot_name, username=username,
                                        profile_photo=profile_photo, profile_thumb=profile_thumb)
         else:
@@ -135,7 +142,7 @@ async def add_bot(bot_id: int, bot_token: str, *, user_model: User = None, user_
                 bot.profile_photo = profile_photo
                 bot.profile_thumbnail = profile_thumb
             if bot.is_valid():
-                save = to_async(bot.save)
+                save = to_async(bot.save, MONGO_WRITE)
                 await save(full_clean=True)
                 return bot
             else:
@@ -180,7 +187,7 @@ async def edit_user_info(user_model: User = None, user_id: int = None, *, new_pa
             user.profile_thumbnail = profile_thumb
 
         if user.is_valid():
-            save = to_async(user.save)
+            save = to_async(user.save, MONGO_WRITE)
             await save(full_clean=True)
             return user
         else:
@@ -223,7 +230,7 @@ async def edit_bot_info(bot_model: Bot = None, bot_id: int = None, bot_token: st
             bot.profile_thumbnail = profile_thumb
 
         if bot.is_valid():
-            save = to_async(bot.save)
+            save = to_async(bot.save, MONGO_WRITE)
             await save(full_clean=True)
             return bot
         else:
@@ -255,25 +262,25 @@ async def delete_user(user_model: User = None, user_id: int = None)-> bool:
         user.deleted_date = datetime.datetime.utcnow()
 
         if user.is_valid():
-            save = to_async(user.save)
+            save = to_async(user.save, MONGO_WRITE)
             await save(full_clean=True)
             data = {'$set': {'isDeleted': True, 'deletedDate': datetime.datetime.utcnow()}}
-            comments_raw = to_async(Comment.objects.raw)
-            channels_raw = to_async(Channel.objects.raw)
+            comments_raw = to_async(Comment.objects.raw, inline=True)
+            channels_raw = to_async(Channel.objects.raw, inline=True)
             all_comments = await comments_raw({'userId': user.uid})
             all_channels = await channels_raw({'channelCreator': user.uid, 'isDeleted': False})
             all_admin_only_channels = await channels_raw({'channelAdmins.uid': user.uid})
 
-            comment_update = to_async(all_comments.update)
-            channels_update = to_async(all_channels.update)
+            comment_update = to_async(all_comments.update, MONGO_WRITE)
+            channels_update = to_async(all_channels.update, MONGO_WRITE)
 
             await comment_update(data)
             await channels_update(data)
             all_channels = await channels_raw({'channelCreator': user.uid, 'isDeleted': True})
             for channel in all_channels:
-                posts_raw = to_async(PostModel.objects.raw)
+                posts_raw = to_async(PostModel.objects.raw, inline=True)
                 all_posts = await posts_raw({'channelId': channel.chid})
-                posts_update = to_async(all_posts.update)
+                posts_update = to_async(all_posts.update, MONGO_WRITE)
                 await posts_update(data)
             for channel_model in all_admin_only_channels:
                 await remove_admins(channel_model=channel_model, user_model=user)
@@ -303,16 +310,16 @@ async def delete_bot(bot_model: Bot = None, bot_id: int = None, bot_token: str =
         bot.deleted_date = datetime.datetime.utcnow()
 
         if bot.is_valid():
-            save = to_async(bot.save)
+            save = to_async(bot.save, MONGO_WRITE)
             await save(full_clean=True)
             data = {'$set': {'channelBot': None}}
-            posts_raw = to_async(PostModel.objects.raw)
-            channels_raw = to_async(Channel.objects.raw)
+            posts_raw = to_async(PostModel.objects.raw, inline=True)
+            channels_raw = to_async(Channel.objects.raw, inline=True)
             all_posts = await posts_raw({'channelBot': bot.bot_id})
             all_channels = await channels_raw({'channelBot': bot.bot_id})
 
-            posts_update = to_async(all_posts.update)
-            channels_update = to_async(all_channels.update)
+            posts_update = to_async(all_posts.update, MONGO_WRITE)
+            channels_update = to_async(all_channels.update, MONGO_WRITE)
             await posts_update(data)
             await channels_update(data)
 
@@ -334,10 +341,9 @@ async def get_users(user_id: int = None, user_ids: List[int] = None)-> Union[Use
     """
 
     try:
-        get = to_async(User.objects.get)
-        raw = to_async(User.objects.raw)
+        raw = to_async(User.objects.raw, inline=True)
         if user_id is not None:
-            user = await get({'userId': user_id, 'isDeleted': False})
+            user = await __USER_FLIGHTS.do(user_id, async_db.find_one, User, {'userId': user_id, 'isDeleted': False})
             return user
         elif user_ids is not None:
             users = await raw({'userId': {'$in': user_ids}, 'isDeleted': False})
@@ -348,6 +354,19 @@ async def get_users(user_id: int = None, user_ids: List[int] = None)-> Union[Use
         raise
 
 
+async def get_user_fields(user_id: int, fields: Iterable[str])-> Dict[str, object]:
+    """
+    Gets only some fields of a single user, as a plain dict, with no [User] instance. Meant for hot reads that only
+    show a few fields.
+    :param user_id: The Telegram's ID of the user
+    :param fields: The attribute names of the fields, as in [User]
+    :return: Dict of the fields, by their attribute names
+    """
+    fields = tuple(fields)
+    return await __USER_FLIGHTS.do((user_id, fields), async_db.find_one_fields, User,
+                                   {'userId': user_id, 'isDeleted': False}, fields)
+
+
 async def get_bots(bot_id: int = None, bot_ids: List[int] = None,
                    bot_token: str = None, bot_tokens: List[str] = None)-> Union[Bot, Iterable[Bot]]:
     """
@@ -363,10 +382,10 @@ async def get_bots(bot_id: int = None, bot_ids: List[int] = None,
     """
 
     try:
-        get = to_async(Bot.objects.get)
-        raw = to_async(Bot.objects.raw)
+        raw = to_async(Bot.objects.raw, inline=True)
         if bot_id is not None or bot_token is not None:
-            bot = await get({'$or': [{'botId': bot_id}, {'botToken': bot_token}]})
+            bot = await __BOT_FLIGHTS.do((bot_id, bot_token), async_db.find_one, Bot,
+                                         {'$or': [{'botId': bot_id}, {'botToken': bot_token}]})
             return bot
         elif bot_ids is not None or bot_tokens is not None:
             bots = await raw({'$or': [{'botId': {'$in': bot_ids}}, {'botToken': {'$in': bot_tokens}}]})
@@ -375,3 +394,15 @@ async def get_bots(bot_id: int = None, bot_ids: List[int] = None,
             raise Bot.DoesNotExist
     except Bot.DoesNotExist:
         raise
+
+
+async def get_bot_fields(bot_id: int, fields: Iterable[str])-> Dict[str, object]:
+    """
+    Gets only some fields of a single bot, as a plain dict, with no [Bot] instance. Meant for hot reads that only show
+    a few fields.
+    :param bot_id: Telegram's bot ID
+    :param fields: The attribute names of the fields, as in [Bot]
+    :return: Dict of the fields, by their attribute names
+    """
+    fields = tuple(fields)
+    return await __BOT_FLIGHTS.do((bot_id, fields), async_db.find_one_fields, Bot, {'botId': bot_id}, fields)
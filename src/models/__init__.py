@@ -21,6 +21,8 @@
 # SUCH DAMAGES.
 #
 
-from src.models import (channels_model, comments_model, post_models, reactions_model, user_models)
+from src.models import (channels_model, comments_model, post_models, reactions_model, user_models, connection,
+                        async_db, post_serializers)
 
-__all__ = ['channels_model', 'comments_model', 'post_models', 'reactions_model', 'user_models.py']
+__all__ = ['channels_model', 'comments_model', 'post_models', 'reactions_model', 'user_models.py', 'connection',
+           'async_db', 'post_serializers']
@@ -0,0 +1,315 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+"""
+Native asyncio access to the same collections used by the models, through Motor. The models stay the source of truth
+for the schema: collection names, databases, read / write concerns and field `mongo_name`s are all taken from them,
+and documents read here are turned into model instances with `from_document`, with no extra query.
+"""
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymodm import MongoModel
+from pymodm.connection import _get_db
+from pymongo import ReturnDocument
+from pymongo.read_concern import ReadConcern
+from typing import Dict, Iterable, List, Type, Union
+from .config import *
+from .connection import client_options
+
+
+__all__ = ['client', 'collection', 'fast_collection', 'mongo_name', 'projection', 'find_one', 'find',
+           'find_documents', 'find_one_fields', 'find_one_and_update', 'find_one_and_delete', 'update_one',
+           'update_many', 'delete_one', 'insert_one', 'insert_many', 'bulk_write', 'aggregate']
+
+
+__CLIENT: AsyncIOMotorClient = None
+__COLLECTIONS: Dict[type, AsyncIOMotorCollection] = {}
+__FAST_COLLECTIONS: Dict[type, AsyncIOMotorCollection] = {}
+
+
+def client()-> AsyncIOMotorClient:
+    """
+    The client shared by every async call. Created on first use, so it binds to the running event loop.
+    :return: [AsyncIOMotorClient] instance
+    """
+    global __CLIENT
+    if __CLIENT is None:
+        __CLIENT = AsyncIOMotorClient(MONGO_URI, **client_options())
+    return __CLIENT
+
+
+def collection(model: Type[MongoModel])-> AsyncIOMotorCollection:
+    """
+    Gets the async collection of a model, with the same database, name and options given in its Meta.
+    :param model: A [MongoModel] class
+    :return: [AsyncIOMotorCollection] instance
+    """
+    _collection = __COLLECTIONS.get(model, None)
+    if _collection is None:
+        meta = model._mongometa
+        database = client()[_get_db(meta.connection_alias).name]
+        _collection = database.get_collection(meta.collection_name,
+                                              codec_options=meta.codec_options,
+                                              read_preference=meta.read_preference,
+                                              write_concern=meta.write_concern,
+                                              read_concern=meta.read_concern)
+        __COLLECTIONS[model] = _collection
+    return _collection
+
+
+def fast_collection(model: Type[MongoModel])-> AsyncIOMotorCollection:
+    """
+    Gets the async collection of a model, like `collection`, but reading with `FAST_READ_CONCERN`.
+    :param model: A [MongoModel] class
+    :return: [AsyncIOMotorCollection] instance
+    """
+    _collection = __FAST_COLLECTIONS.get(model, None)
+    if _collection is None:
+        _collection = collection(model).with_options(read_concern=ReadConcern(FAST_READ_CONCERN))
+        __FAST_COLLECTIONS[model] = _collection
+    return _collection
+
+
+def mongo_name(model: Type[MongoModel], field: str)-> str:
+    """
+    Gets the name a field has in the database.
+    :param model: A [MongoModel] class
+    :param field: The attribute name of the field in the model
+    :return: The `mongo_name` of the field
+    """
+    return model._mongometa.get_field_from_attname(field).mongo_name
+
+
+def projection(model: Type[MongoModel], fields: Iterable[str])-> Dict[str, int]:
+    """
+    Builds a projection from attribute names. `_id` is left out, unless it is one of the fields.
+    :param model: A [MongoModel] class
+    :param fields: The attribute names of the fields in the model
+    :return: The projection, using the database field names
+    """
+    _projection = {mongo_name(model, field): 1 for field in fields}
+    _projection.setdefault('_id', 0)
+    return _projection
+
+
+async def find_one(model: Type[MongoModel], query: dict, projection: Union[dict, List[str]] = None)-> MongoModel:
+    """
+    Gets a single document, as a model instance.
+    :param model: A [MongoModel] class
+    :param query: The query, using the database field names
+    :param projection: (Optional) Fields to be returned
+    :return: A `model` instance (or of one of its subclasses). Raises `model.DoesNotExist` if nothing matches.
+    """
+    document = await collection(model).find_one(query, projection)
+    if document is None:
+        raise model.DoesNotExist()
+    return model.from_document(document)
+
+
+async def find(model: Type[MongoModel], query: dict, projection: Union[dict, List[str]] = None, *,
+               sort: list = None, skip: int = 0, limit: int = 0)-> List[MongoModel]:
+    """
+    Gets all the documents that match a query, as model instances.
+    :param model: A [MongoModel] class
+    :param query: The query, using the database field names
+    :param projection: (Optional) Fields to be returned
+    :param sort: (Optional) List of (field, direction) pairs
+    :param skip: Quantity of documents to be skipped
+    :param limit: Maximum quantity of documents. 0 means no limit
+    :return: List of `model` instances
+    """
+    cursor = collection(model).find(query, projection, skip=skip, limit=limit, sort=sort)
+    return [model.from_document(document) async for document in cursor]
+
+
+async def find_documents(model: Type[MongoModel], query: dict, projection: Union[dict, List[str]] = None, *,
+                         sort: list = None, skip: int = 0, limit: int = 0)-> List[dict]:
+    """
+    Gets all the documents that match a query, as raw documents, skipping the model instances.
+    :param model: A [MongoModel] class
+    :param query: The query, using the database field names
+    :param projection: (Optional) Fields to be returned
+    :param sort: (Optional) List of (field, direction) pairs
+    :param skip: Quantity of documents to be skipped
+    :param limit: Maximum quantity of documents. 0 means no limit
+    :return: List of raw documents
+    """
+    cursor = collection(model).find(query, projection, skip=skip, limit=limit, sort=sort)
+    return [document async for document in cursor]
+
+
+async def find_one_fields(model: Type[MongoModel], query: dict, fields: Iterable[str], *,
+                          fast: bool = True)-> Dict[str, object]:
+    """
+    Gets only some fields of a single document, as a plain dict, with no model instance.
+    :param model: A [MongoModel] class
+    :param query: The query, using the database field names
+    :param fields: The attribute names of the fields to be returned
+    :param fast: If True, reads with `FAST_READ_CONCERN` instead of the read concern of the model
+    :return: Dict of the fields, by their attribute names. Raises `model.DoesNotExist` if nothing matches.
+    """
+    names = [(field, mongo_name(model, field)) for field in fields]
+    _collection = fast_collection(model) if fast else collection(model)
+    document = await _collection.find_one(query, projection(model, fields))
+    if document is None:
+        raise model.DoesNotExist()
+    return {field: document.get(name, None) for field, name in names}
+
+
+async def find_one_and_update(model: Type[MongoModel], query: dict, update: Union[dict, List[dict]], *,
+                              upsert: bool = False, projection: Union[dict, List[str]] = None,
+                              return_new: bool = True)-> Union[dict, None]:
+    """
+    Atomically updates a single document and returns it.
+    :param model: A [MongoModel] class
+    :param query: The query, using the database field names
+    :param update: The update operations, or the stages of a pipeline update
+    :param upsert: If True, inserts the document if nothing matches
+    :param projection: (Optional) Fields to be returned
+    :param return_new: If True, returns the document after the update; the document before it otherwise
+    :return: The raw document, or None
+    """
+    return await collection(model).find_one_and_update(
+        query, update, projection=projection, upsert=upsert,
+        return_document=ReturnDocument.AFTER if return_new else ReturnDocument.BEFORE)
+
+
+async def find_one_and_delete(model: Type[MongoModel], query: dict, *,
+                              projection: Union[dict, List[str]] = None)-> Union[dict, None]:
+    """
+    Atomically deletes a single document and returns it.
+    :param model: A [MongoModel] class
+    :param query: The query, using the database field names
+    :param projection: (Optional) Fields to be returned
+    :return: The raw document deleted, or None
+    """
+    return await collection(model).find_one_and_delete(query, projection=projection)
+
+
+async def update_one(model: Type[MongoModel], query: dict, update: dict, *, upsert: bool = False)-> int:
+    """
+    Updates a single document.
+    :return: Quantity of documents modified
+    """
+    result = await collection(model).update_one(query, update, upsert=upsert)
+    return result.modified_count
+
+
+async def update_many(model: Type[MongoModel], query: dict, update: dict)-> int:
+    """
+    Updates all the documents that match a query.
+    :return: Quantity of documents modified
+    """
+    result = await collection(model).update_many(query, update)
+    return result.modified_count
+
+
+async def delete_one(model: Type[MongoModel], query: dict)-> int:
+    """
+    Deletes a single document.
+    :return: Quantity of documents deleted
+    """
+    result = await collection(model).delete_one(query)
+    return result.deleted_count
+
+
+async def insert_one(instance: MongoModel, full_clean: bool = True)-> MongoModel:
+    """
+    Inserts a model instance as a new document.
+    :param instance: The model instance
+    :param full_clean: If True, validates the instance before inserting
+    :return: The same instance
+    """
+    if full_clean:
+        instance.full_clean()
+    await collection(type(instance)).insert_one(instance.to_son())
+    return instance
+
+
+async def insert_many(instances: List[MongoModel], full_clean: bool = True, ordered: bool = True)-> List[MongoModel]:
+    """
+    Inserts model instances as new documents, with a single round trip. All the instances must be stored in the same
+    collection.
+    :param instances: The model instances
+    :param full_clean: If True, validates every instance before inserting any of them
+    :param ordered: If True, stops at the first failed insert; tries every insert otherwise
+    :return: The same instances
+    """
+    if not instances:
+        return instances
+    if full_clean:
+        for instance in instances:
+            instance.full_clean()
+    await collection(type(instances[0])).insert_many([instance.to_son() for instance in instances], ordered=ordered)
+    return instances
+
+
+async def bulk_write(model: Type[MongoModel], requests: list, ordered: bool = False):
+    """
+    Sends many write operations to the collection of a model, with a single round trip.
+    :param model: A [MongoModel] class
+    :param requests: List of pymongo write operations, like `UpdateOne`, using the database field names
+    :param ordered: If True, stops at the first failed operation; tries every operation otherwise
+    :return: [BulkWriteResult] of the operations
+    """
+    return await collection(model).bulk_write(requests, ordered=ordered)
+
+
+async def aggregate(model: Type[MongoModel], pipeline: List[dict], *, allow_disk_use: bool = False)-> List[dict]:
+    """
+    Runs an aggregation pipeline on the collection of a model.
+    :param model: A [MongoModel] class
+    :param pipeline: The stages of the pipeline, using the database field names
+    :param allow_disk_use: If True, stages over the memory limit of the server write temporary files
+    :return: List of raw documents
+    """
+    cursor = collection(model).aggregate(pipeline, allowDiskUse=allow_disk_use)
+    return [document async for document in cursor]
+
+
+async def drop_indexes(model: Type[MongoModel], names: Iterable[str])-> List[str]:
+    """
+    Drops indexes from the collection of a model, by name. Indexes not found are skipped.
+    :param model: A [MongoModel] class
+    :param names: Names of the indexes
+    :return: Names of the indexes dropped
+    """
+    _collection = collection(model)
+    existing = await _collection.index_information()
+    dropped = [name for name in names if name in existing]
+    for name in dropped:
+        await _collection.drop_index(name)
+    return dropped
+
+
+async def create_indexes(model: Type[MongoModel])-> List[str]:
+    """
+    Creates the indexes declared in the Meta of a model. Indexes that already exist, with the same options, are left
+    as they are.
+    :param model: A [MongoModel] class
+    :return: Names of the indexes
+    """
+    indexes = model._mongometa.indexes
+    if not indexes:
+        return []
+    return await collection(model).create_indexes(indexes)
@@ -21,13 +21,14 @@
 # SUCH DAMAGES.
 #
 
-from pymodm import fields, MongoModel, EmbeddedMongoModel, connect
+from pymodm import fields, MongoModel, EmbeddedMongoModel
 from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference
 from re import compile
 from ..models.user_models import User, Bot
 from .config import *
+from .connection import connect
 
-connect(f'{MONGO_URI}/channels', alias='Channels', ssl=USE_SSL, username=DB_ADMIN_USERNAME, password=DB_ADMIN_PASSWORD)
+connect('channels', alias='Channels')
 
 username_pattern = compile('[\w\d_]+')
 
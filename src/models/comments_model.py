@@ -21,13 +21,14 @@
 # SUCH DAMAGES.
 #
 
-from pymodm import fields, MongoModel, EmbeddedMongoModel, connect
-from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference
+from pymodm import fields, MongoModel, EmbeddedMongoModel
+from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference, ASCENDING, DESCENDING
 from ..models.user_models import User
 from ..models.post_models import PostModel
 from .config import *
+from .connection import connect
 
-connect(f'{MONGO_URI}/comments', alias='Comments', ssl=USE_SSL, username=DB_ADMIN_USERNAME, password=DB_ADMIN_PASSWORD)
+connect('comments', alias='Comments')
 
 
 class CommentRank(EmbeddedMongoModel):
@@ -62,7 +63,13 @@ class BaseComment(MongoModel):
             IndexModel('commentId', name='commentIdIndex', unique=True, sparse=True),
             IndexModel('postReference', name='postReferenceIndex', sparse=True),
             IndexModel('replyTo', name='replyToReferenceIndex', sparse=True),
-            IndexModel('rankPosition', name='rankPositionIndex', sparse=True)
+            IndexModel('rankPosition', name='rankPositionIndex', sparse=True),
+            # Pages of the comments of a post, best ranked first
+            IndexModel([('postReference', ASCENDING), ('rankPosition', DESCENDING), ('_id', DESCENDING)],
+                       name='commentPostRankIndex'),
+            # Newest replies of a comment first
+            IndexModel([('replyTo', ASCENDING), ('createdDate', DESCENDING), ('_id', DESCENDING)],
+                       name='commentReplyDateIndex')
         ]
         ignore_unknown_fields = True
 
@@ -70,6 +77,8 @@ class BaseComment(MongoModel):
 class Comment(BaseComment):
     rank = fields.EmbeddedDocumentField(CommentRank, verbose_name='rank', mongo_name='rank', required=True)
     rank_position = fields.FloatField(verbose_name='rank_position', mongo_name='rankPosition', default=0.0)
+    # Kept by the comment controllers, with `$inc`. Only replies not deleted are counted
+    reply_count = fields.BigIntegerField(verbose_name='reply_count', mongo_name='replyCount', min_value=0, default=0)
 
 
 class CommentReply(BaseComment):
@@ -94,8 +103,10 @@ class UserGivenCommentRank(MongoModel):
         read_preference = ReadPreference.NEAREST
         read_concern = rc.ReadConcern(level='majority')
         indexes = [
-            IndexModel('userId', name='rankUserIdIndex', unique=True, sparse=True),
-            IndexModel('commentId', name='rankCommentIdIndex', unique=True, sparse=True),
-            IndexModel('rankType', name='rankTypeIndex', unique=True, sparse=True)
+            IndexModel('userId', name='rankUserIdIndex', sparse=True),
+            IndexModel('commentId', name='rankCommentIdIndex', sparse=True),
+            IndexModel('rankType', name='rankTypeIndex', sparse=True),
+            # A single rank per user on each comment
+            IndexModel([('userId', ASCENDING), ('commentId', ASCENDING)], name='rankUserCommentIndex', unique=True)
         ]
         ignore_unknown_fields = True
@@ -32,3 +32,53 @@ USE_SSL = False
 DB_ADMIN_USERNAME = None
 
 DB_ADMIN_PASSWORD = None
+
+# Connection pool of the MongoClient shared by the whole process. Size it to the quantity of executor threads plus the
+# concurrent async operations of a worker.
+MAX_POOL_SIZE = 100
+
+MIN_POOL_SIZE = 0
+
+MAX_IDLE_TIME_MS = 60 * 1000
+
+WAIT_QUEUE_TIMEOUT_MS = 5 * 1000
+
+# Quantity of documents the post counters are spread over. Can be raised at any time, but never lowered, since the
+# totals only sum the shards up to this number.
+ANALYTICS_SHARDS = 16
+
+# Seconds between flushes of the counter deltas buffered by a worker.
+ANALYTICS_FLUSH_INTERVAL = 5
+
+# Seconds between flushes of the reaction counter deltas buffered by a worker. Taps on the same post within this
+# window are written as a single increment.
+REACTION_FLUSH_INTERVAL = 0.05
+
+# Maximum quantity of posts in a single request for reaction states.
+MAX_REACTION_STATES = 100
+
+# Quantity of sequence numbers a worker reserves at once.
+SEQUENCE_BLOCK_SIZE = 1000
+
+# Read concern of the hot reads that only need a few fields of a document (profiles of users, bots and channels,
+# single posts). 'local' answers from the member that gets the query, without waiting for the majority.
+FAST_READ_CONCERN = 'local'
+
+# Reaction count reconciliation: posts per chunk, chunks processed at once, and seconds a post must go without reaction
+# changes before its counters are touched (taps still buffered by some worker would be counted twice otherwise). Workers
+# stamp the change time of a post at most once every half of `RECONCILE_SETTLE_TIME`. The repair of the comment counters
+# skips the posts with comments changed within the same time.
+RECONCILE_CHUNK_SIZE = 500
+
+RECONCILE_CONCURRENCY = 4
+
+RECONCILE_SETTLE_TIME = 60
+
+# Quantile of the confidence level used to rank comments (1.281551565545 is 80% confidence). After changing it, re-rank
+# the existing comments with `python manage.py rerank-comments`.
+COMMENT_RANK_Z = 1.281551565545
+
+# Maximum quantity of comments in a single request for replies, and of replies returned for each comment.
+MAX_REPLY_COMMENTS = 100
+
+MAX_REPLIES_PER_COMMENT = 20
@@ -0,0 +1,165 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+"""
+A single, pooled MongoClient shared by every connection alias used by the models. `pymodm.connect` creates a new
+client (with its own pool and server monitoring) per alias, even when all of them point to the same server.
+"""
+
+from pymodm.connection import ConnectionInfo, _CONNECTIONS
+from pymongo import MongoClient, monitoring, uri_parser
+from threading import Lock, local
+from typing import Dict, Union
+import time
+from .config import *
+
+
+__all__ = ['connect', 'get_client', 'client_options', 'pool_stats', 'pool_listener']
+
+
+class _PoolListener(monitoring.ConnectionPoolListener):
+    """
+    Collects connection pool metrics, mainly how long it takes to check a connection out of the pool.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._local = local()
+        self.checkouts = 0
+        self.failed_checkouts = 0
+        self.checked_out = 0
+        self.total_checkout_time = 0.0
+        self.max_checkout_time = 0.0
+        self.created = 0
+        self.closed = 0
+
+    def connection_check_out_started(self, event):
+        # The check out start and end events are published on the same thread
+        self._local.started = time.monotonic()
+
+    def connection_checked_out(self, event):
+        elapsed = time.monotonic() - getattr(self._local, 'started', time.monotonic())
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.total_checkout_time += elapsed
+            if elapsed > self.max_checkout_time:
+                self.max_checkout_time = elapsed
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.failed_checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def snapshot(self)-> Dict[str, Union[int, float]]:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'failed_checkouts': self.failed_checkouts,
+                'checked_out': self.checked_out,
+                'open_connections': self.created - self.closed,
+                'avg_checkout_time': (self.total_checkout_time / self.checkouts) if self.checkouts else 0.0,
+                'max_checkout_time': self.max_checkout_time,
+            }
+
+
+pool_listener = _PoolListener()
+
+__CLIENT: MongoClient = None
+__LOCK = Lock()
+
+
+def client_options()-> dict:
+    """
+    Options shared by every client of the application, sync or async.
+    :return: Dict of keyword arguments for the client
+    """
+    return dict(
+        ssl=USE_SSL,
+        username=DB_ADMIN_USERNAME,
+        password=DB_ADMIN_PASSWORD,
+        maxPoolSize=MAX_POOL_SIZE,
+        minPoolSize=MIN_POOL_SIZE,
+        maxIdleTimeMS=MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[pool_listener],
+    )
+
+
+def get_client()-> MongoClient:
+    """
+    The client shared by every connection alias. Created on first use.
+    :return: [MongoClient] instance
+    """
+    global __CLIENT
+    if __CLIENT is None:
+        with __LOCK:
+            if __CLIENT is None:
+                __CLIENT = MongoClient(MONGO_URI, **client_options())
+    return __CLIENT
+
+
+def connect(database: str, alias: str)-> None:
+    """
+    Registers a pymodm connection alias to a database, using the shared client.
+    :param database: The name of the database
+    :param alias: The connection alias used in the models Meta
+    """
+    uri = f'{MONGO_URI}/{database}'
+    _CONNECTIONS[alias] = ConnectionInfo(parsed_uri=uri_parser.parse_uri(uri), conn_string=uri,
+                                         database=get_client()[database])
+
+
+def pool_stats()-> Dict[str, Union[int, float]]:
+    """
+    Metrics of the connection pools: check outs, failed check outs, connections checked out right now, open
+    connections, and the average and maximum time (in seconds) waited to check a connection out.
+    :return: Dict with the metrics
+    """
+    return pool_listener.snapshot()
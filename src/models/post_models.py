@@ -21,17 +21,23 @@
 # SUCH DAMAGES.
 #
 
-from pymodm import fields, MongoModel, EmbeddedMongoModel, connect
-from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference
+from pymodm import fields, MongoModel, EmbeddedMongoModel
+from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference, DESCENDING
 from .channels_model import Channel
 from .user_models import User
 from .config import *
+from .connection import connect
 
 
-connect(f'{MONGO_URI}/posts', alias='Posts', ssl=USE_SSL, username=DB_ADMIN_USERNAME, password=DB_ADMIN_PASSWORD)
+connect('posts', alias='Posts')
 
 
 class GlobalPostAnalytics(MongoModel):
+    """
+    Counters of posts. The counters are spread over `ANALYTICS_SHARDS` documents (`_id` 1 to `ANALYTICS_SHARDS`), so
+    concurrent writers don't all increment the same document; the document with `_id` 0 holds the counts made before
+    the sharding. The totals are the sum of every document.
+    """
     _id = fields.IntegerField(required=True, primary_key=True, default=0)
     created_posts = fields.BigIntegerField(required=True, verbose_name='created_posts', mongo_name='createdPosts',
                                            min_value=0, default=0)
@@ -54,6 +60,23 @@ class GlobalPostAnalytics(MongoModel):
         ignore_unknown_fields = True
 
 
+class Sequence(MongoModel):
+    """
+    A named sequence of numbers. Workers reserve blocks of it at once, and hand out the numbers of the block locally.
+    """
+    _id = fields.CharField(required=True, primary_key=True)
+    value = fields.BigIntegerField(required=True, verbose_name='sequence_value', mongo_name='value', min_value=0,
+                                   default=0)
+
+    class Meta:
+        connection_alias = 'Posts'
+        collection_name = 'sequences'
+        write_concern = wc.WriteConcern(j=True)
+        read_preference = ReadPreference.PRIMARY
+        read_concern = rc.ReadConcern(level='majority')
+        ignore_unknown_fields = True
+
+
 class Link(EmbeddedMongoModel):
     label = fields.CharField(required=True, verbose_name='link_label', mongo_name='label')
     url = fields.URLField(required=True, verbose_name='link_url', mongo_name='url')
@@ -93,6 +116,13 @@ class PostModel(BasePostModel):
     links = fields.EmbeddedDocumentField(LinkList, verbose_name='links', mongo_name='links', default=None)
     reactions = fields.EmbeddedDocumentField(Reaction, verbose_name='reactions', mongo_name='reactions',
                                              default=None)
+    # Last time the reactions of the post changed, kept by the reaction controllers for the reconciliation of counters
+    reactions_changed_date = fields.DateTimeField(verbose_name='reactions_changed_date',
+                                                  mongo_name='reactionsChangedDate', default=None)
+    # Kept by the comment controllers, with `$inc`. Only comments and replies not deleted are counted
+    comment_count = fields.BigIntegerField(verbose_name='comment_count', mongo_name='commentCount', min_value=0,
+                                           default=0)
+    reply_count = fields.BigIntegerField(verbose_name='reply_count', mongo_name='replyCount', min_value=0, default=0)
     is_deleted = fields.BooleanField(verbose_name='post_is_deleted', mongo_name='isDeleted', default=False)
     deleted_date = fields.DateTimeField(verbose_name='post_deleted_date', mongo_name='deletedDate', default=None)
 
@@ -106,38 +136,25 @@ class PostModel(BasePostModel):
         indexes = [
             IndexModel('creator', name='postCreatorIndex', sparse=True),
             IndexModel('postId', name='postIdIndex', unique=True, sparse=True),
-            IndexModel('groupHash', name='postGroupHashIndex', unique=True, sparse=True),
+            # Every post of a group has the same hash, so this one can't be unique
+            IndexModel('groupHash', name='postGroupIndex', sparse=True),
             IndexModel('messageId', name='postMessageIdIndex', sparse=True),
             IndexModel('channelId', name='postChannelIdIndex', sparse=True),
-            IndexModel('createdDate', name='postCreatedDateIndex', sparse=True)
+            IndexModel('createdDate', name='postCreatedDateIndex', sparse=True),
+            # Channel feed, newest first, with `_id` to break ties between posts created at the same time
+            IndexModel([('channelId', DESCENDING), ('createdDate', DESCENDING), ('_id', DESCENDING)],
+                       name='postChannelFeedIndex')
         ]
         ignore_unknown_fields = True
 
     @property
     def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ])
+        """
+        The post serialized by its type, with `creator` and `channel` as their IDs. Nothing is fetched from the
+        database; use `post_serializers.expand_references` to replace the IDs by the user and channel.
+        """
+        from .post_serializers import serialize_model
+        return serialize_model(self)
 
 
 class ImagePost(PostModel):
@@ -149,44 +166,6 @@ class ImagePost(PostModel):
     width = fields.IntegerField(verbose_name='width', mongo_name='width', required=True)
     height = fields.IntegerField(verbose_name='height', mongo_name='height', required=True)
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            image=dict(
-                file_id=self.file_id,
-                file_size=self.file_size,
-                width=self.width,
-                height=self.height,
-                thumbnail=dict(
-                    file_id=self.thumbnail_file_id,
-                    file_size=self.thumbnail_size
-                ),
-                caption=self.caption
-            )
-        )
-
 
 class VideoNotePost(PostModel):
     file_id = fields.CharField(required=True, verbose_name='file_id', mongo_name='fileId')
@@ -197,131 +176,14 @@ class VideoNotePost(PostModel):
     duration = fields.IntegerField(verbose_name='duration', mongo_name='duration', required=True)
     length = fields.IntegerField(verbose_name='length', mongo_name='length', required=True)
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            video_note=dict(
-                file_id=self.file_id,
-                file_size=self.file_size,
-                length=self.length,
-                duration=self.duration,
-                thumbnail=dict(
-                    file_id=self.thumbnail_file_id,
-                    file_size=self.thumbnail_size
-                ),
-                caption=self.caption
-            )
-        )
-
 
 class VideoPost(ImagePost):
     duration = fields.IntegerField(verbose_name='duration', mongo_name='duration', required=True)
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            video=dict(
-                file_id=self.file_id,
-                file_size=self.file_size,
-                width=self.width,
-                height=self.height,
-                duration=self.duration,
-                thumbnail=dict(
-                    file_id=self.thumbnail_file_id,
-                    file_size=self.thumbnail_size
-                ),
-                caption=self.caption
-            )
-        )
-
 
 class AnimationPost(VideoPost):
     file_name = fields.CharField(verbose_name='file_name', mongo_name='fileName', default=None)
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            animation=dict(
-                file_id=self.file_id,
-                file_size=self.file_size,
-                width=self.width,
-                height=self.height,
-                duration=self.duration,
-                file_name=self.file_name,
-                thumbnail=dict(
-                    file_id=self.thumbnail_file_id,
-                    file_size=self.thumbnail_size
-                ),
-                caption=self.caption
-            )
-        )
-
 
 class VoicePost(PostModel):
     file_id = fields.CharField(required=True, verbose_name='file_id', mongo_name='fileId')
@@ -329,39 +191,6 @@ class VoicePost(PostModel):
     file_size = fields.IntegerField(verbose_name='file_size', mongo_name='fileSize', default=None)
     caption = fields.CharField(verbose_name='caption', mongo_name='caption', default=None)
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            voice=dict(
-                file_id=self.file_id,
-                file_size=self.file_size,
-                duration=self.duration,
-                caption=self.caption
-            )
-        )
-
 
 class AudioPost(VoicePost):
     performer = fields.CharField(verbose_name='performer', mongo_name='performer', default=None)
@@ -369,45 +198,6 @@ class AudioPost(VoicePost):
     thumbnail_file_id = fields.CharField(verbose_name='thumbnail_file_id', mongo_name='thumbFileId', default=None)
     thumbnail_size = fields.IntegerField(verbose_name='thumbnail_size', mongo_name='thumbSize', default=None)
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            audio=dict(
-                file_id=self.file_id,
-                file_size=self.file_size,
-                performer=self.performer,
-                duration=self.duration,
-                title=self.title,
-                thumbnail=dict(
-                    file_id=self.thumbnail_file_id,
-                    file_size=self.thumbnail_size
-                ),
-                caption=self.caption
-            )
-        )
-
 
 class DocumentPost(PostModel):
     file_id = fields.CharField(required=True, verbose_name='file_id', mongo_name='fileId')
@@ -417,111 +207,15 @@ class DocumentPost(PostModel):
     caption = fields.CharField(verbose_name='caption', mongo_name='caption', default=None)
     file_name = fields.CharField(verbose_name='file_name', mongo_name='fileName', default=None)
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            document=dict(
-                file_id=self.file_id,
-                file_size=self.file_size,
-                file_name=self.file_name,
-                thumbnail=dict(
-                    file_id=self.thumbnail_file_id,
-                    file_size=self.thumbnail_size
-                ),
-                caption=self.caption
-            )
-        )
-
 
 class TextPost(PostModel):
     text = fields.CharField(required=True, verbose_name='text', mongo_name='text', default='')
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            text=self.text
-        )
-
 
 class LocationPost(PostModel):
     latitude = fields.FloatField(required=True, verbose_name='location_latitude', mongo_name='latitude')
     longitude = fields.FloatField(required=True, verbose_name='location_longitude', mongo_name='longitude')
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            location=dict(
-                latitude=self.latitude,
-                longitude=self.longitude
-            )
-        )
-
 
 class VenuePost(LocationPost):
     title = fields.CharField(required=True, verbose_name='venue_title', mongo_name='title')
@@ -529,43 +223,6 @@ class VenuePost(LocationPost):
     foursquare_id = fields.CharField(verbose_name='foursquare_id', mongo_name='foursquareId', default=None)
     foursquare_type = fields.CharField(verbose_name='foursquare_type', mongo_name='foursquareType', default=None)
 
-    @property
-    def dict(self):
-        return dict(
-            post_id=self.post_id,
-            message_id=self.message_id,
-            creator=self.creator,
-            channel=self.channel,
-            type=self.type,
-            mime_type=self.mime_type,
-            group=self.group_hash,
-            created_date=self.created_date,
-            tags=self.tags,
-            links=dict(
-                links_per_row=self.links.links_per_row,
-                links=[
-                    {'label': i.label, 'url': i.url} for i in self.links.links
-                ]
-            ),
-            source=dict(
-                label=self.source.label,
-                url=self.source.url
-            ),
-            reactions=[
-                dict(emoji=i.emoji, count=i.count) for i in self.reactions.reactions
-            ],
-            venue=dict(
-                location=dict(
-                    latitude=self.latitude,
-                    longitude=self.longitude
-                ),
-                title=self.title,
-                address=self.address,
-                foursquare_id=self.foursquare_id,
-                foursquare_type=self.foursquare_type
-            )
-        )
-
 
 class Posts(MongoModel):
     _id = fields.CharField(required=True, primary_key=True)
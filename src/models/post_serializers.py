@@ -0,0 +1,299 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+"""
+Serializers of posts, working straight on their raw documents. Each post type gets one function, compiled once from a
+layout of the fields it exposes, which builds the whole response dict with plain `dict.get` calls, with no model
+instance in the way.
+"""
+
+from typing import Callable, Dict, Iterable, List, Type, Union
+from .post_models import (PostModel, TextPost, ImagePost, VideoPost, AnimationPost, VideoNotePost, VoicePost,
+                          AudioPost, DocumentPost, LocationPost, VenuePost, Link, LinkList)
+from .reactions_model import Reaction, ReactionObj
+from .user_models import User
+from .channels_model import Channel
+from . import async_db
+
+
+__all__ = ['register', 'serializer', 'document_serializer', 'serialize', 'serialize_many', 'serialize_model',
+           'expand_references', 'unreachable_models']
+
+
+# A layout maps each key of the output to either the attribute name of a field, a tuple of (attribute name,
+# converter of the raw value), or a nested layout.
+Layout = Dict[str, Union[str, tuple, dict]]
+
+__SERIALIZERS: Dict[str, Callable[[dict], dict]] = {}
+# Serializers by the `_cls` of the documents. Some types share a `type` value (venues are stored as 'location'), so the
+# class of the document is what picks the serializer; `type` is only used for documents with no `_cls`.
+__CLASS_SERIALIZERS: Dict[str, Callable[[dict], dict]] = {}
+
+
+def _mongo_name(model, attname: str)-> str:
+    return model._mongometa.get_field_from_attname(attname).mongo_name
+
+
+__LABEL = _mongo_name(Link, 'label')
+__URL = _mongo_name(Link, 'url')
+__LINKS = _mongo_name(LinkList, 'links')
+__LINKS_PER_ROW = _mongo_name(LinkList, 'links_per_row')
+__REACTIONS = _mongo_name(Reaction, 'reactions')
+__EMOJI = _mongo_name(ReactionObj, 'emoji')
+__COUNT = _mongo_name(ReactionObj, 'count')
+
+
+def _source(value: dict)-> Union[dict, None]:
+    if value is None:
+        return None
+    return {'label': value.get(__LABEL), 'url': value.get(__URL)}
+
+
+def _links(value: dict)-> Union[dict, None]:
+    if value is None:
+        return None
+    return {
+        'links_per_row': value.get(__LINKS_PER_ROW),
+        'links': [{'label': link.get(__LABEL), 'url': link.get(__URL)} for link in value.get(__LINKS) or ()],
+    }
+
+
+def _count(value: int)-> int:
+    # Posts created before the counter was added have no value
+    return value or 0
+
+
+def _reactions(value: dict)-> list:
+    if value is None:
+        return []
+    return [{'emoji': reaction.get(__EMOJI), 'count': reaction.get(__COUNT)}
+            for reaction in value.get(__REACTIONS) or ()]
+
+
+# Fields shared by every post type
+COMMON_LAYOUT: Layout = {
+    'post_id': 'post_id',
+    'message_id': 'message_id',
+    'creator': 'creator',
+    'channel': 'channel',
+    'type': 'type',
+    'mime_type': 'mime_type',
+    'group': 'group_hash',
+    'created_date': 'created_date',
+    'tags': 'tags',
+    'links': ('links', _links),
+    'source': ('source', _source),
+    'reactions': ('reactions', _reactions),
+    'comment_count': ('comment_count', _count),
+    'reply_count': ('reply_count', _count),
+}
+
+_THUMBNAIL = {'file_id': 'thumbnail_file_id', 'file_size': 'thumbnail_size'}
+
+
+def _compile(name: str, model: type, layout: Layout)-> Callable[[dict], dict]:
+    """
+    Generates the source of a serializer function for a layout, and compiles it.
+    :param name: Name of the serializer, only used to name the function
+    :param model: The [MongoModel] class of the documents, to resolve the database name of each field
+    :param layout: The layout of the output
+    :return: The serializer function
+    """
+    namespace = {}
+
+    def expression(value)-> str:
+        if isinstance(value, dict):
+            items = ', '.join(f'{key!r}: {expression(item)}' for key, item in value.items())
+            return '{' + items + '}'
+        if isinstance(value, tuple):
+            attname, converter = value
+            name = f'_convert_{len(namespace)}'
+            namespace[name] = converter
+            return f'{name}(get({_mongo_name(model, attname)!r}))'
+        return f'get({_mongo_name(model, value)!r})'
+
+    source = (f'def serialize_{name}(document):\n'
+              f'    get = document.get\n'
+              f'    return {expression(layout)}\n')
+    exec(compile(source, f'<{name} serializer>', 'exec'), namespace)
+    return namespace[f'serialize_{name}']
+
+
+def register(post_type: str, model: Type[PostModel], layout: Layout)-> None:
+    """
+    Compiles and registers the serializer of a post type. The output has the `COMMON_LAYOUT` keys, plus `layout`.
+    References (`creator` and `channel`) are output as the ID of the referenced document.
+    :param post_type: The value of the `type` field of the posts
+    :param model: The [PostModel] class of the type. Documents of this class get this serializer, whatever their `type`
+    :param layout: The keys specific to the type
+    """
+    full_layout = dict(COMMON_LAYOUT)
+    full_layout.update(layout)
+    compiled = _compile(post_type, model, full_layout)
+    __CLASS_SERIALIZERS[model._mongometa.object_name] = compiled
+    __SERIALIZERS.setdefault(post_type, compiled)
+
+
+def serializer(post_type: str)-> Callable[[dict], dict]:
+    """
+    :param post_type: The value of the `type` field of the posts
+    :return: The serializer of the type. Unknown types get the serializer of the fields common to every post.
+    """
+    return __SERIALIZERS.get(post_type, None) or __SERIALIZERS[None]
+
+
+def document_serializer(document: dict)-> Callable[[dict], dict]:
+    """
+    :param document: The post, as stored in the database, with its `_cls`
+    :return: The serializer of the class of the document, or of its type if the document has no known class
+    """
+    return __CLASS_SERIALIZERS.get(document.get('_cls', None), None) or serializer(document.get('type', None))
+
+
+def serialize(document: dict)-> dict:
+    """
+    Serializes a raw post document.
+    :param document: The post, as stored in the database. Must keep its `_cls`
+    :return: Dict ready to be encoded as JSON
+    """
+    return document_serializer(document)(document)
+
+
+def serialize_many(documents: Iterable[dict])-> List[dict]:
+    """
+    Serializes raw post documents, keeping their order.
+    :param documents: The posts, as stored in the database. Must keep their `_cls`
+    :return: List of dicts ready to be encoded as JSON
+    """
+    return [document_serializer(document)(document) for document in documents]
+
+
+def serialize_model(post: PostModel)-> dict:
+    """
+    Serializes a post instance, through its document.
+    :param post: [PostModel] instance
+    :return: Dict ready to be encoded as JSON
+    """
+    return serialize(post.to_son())
+
+
+def _projection(model: type, layout: Layout)-> Dict[str, int]:
+    """
+    :return: Projection of the database fields used by a layout
+    """
+    projection = {}
+    for value in layout.values():
+        if isinstance(value, dict):
+            projection.update(_projection(model, value))
+        else:
+            attname = value[0] if isinstance(value, tuple) else value
+            projection[_mongo_name(model, attname)] = 1
+    return projection
+
+
+# How each reference of a post is expanded: the referenced model, and the layout of its public fields, the same ones
+# the users and channels endpoints return.
+REFERENCE_LAYOUTS: Dict[str, tuple] = {
+    'creator': (User, {
+        'user_id': 'uid',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'user_name': 'username',
+        'profile_photo': {'photo': 'profile_photo', 'thumbnail': 'profile_thumbnail'},
+    }),
+    'channel': (Channel, {
+        'channel_id': 'chid',
+        'title': 'title',
+        'description': 'description',
+        'profile_photo': 'photo_id',
+    }),
+}
+
+__REFERENCES = {key: (model, _compile(key, model, layout), _projection(model, layout))
+                for key, (model, layout) in REFERENCE_LAYOUTS.items()}
+
+
+async def expand_references(posts: List[dict], references: Iterable[str] = ('creator', 'channel'))-> List[dict]:
+    """
+    Replaces the reference IDs of serialized posts by the referenced documents. Each kind of reference is loaded with a
+    single `$in` query for the whole list, however many posts there are.
+    :param posts: Posts serialized by this module. They are changed in place
+    :param references: Keys to be expanded, among the keys of `REFERENCE_LAYOUTS`
+    :return: The same list of posts. References to documents that no longer exist become None
+    """
+    for key in references:
+        model, _serializer, projection = __REFERENCES[key]
+        ids = list({post[key] for post in posts if post.get(key, None) is not None})
+        if not ids:
+            continue
+        documents = await async_db.find_documents(model, {'_id': {'$in': ids}}, projection)
+        expanded = {document['_id']: _serializer(document) for document in documents}
+        for post in posts:
+            post[key] = expanded.get(post.get(key, None), None)
+    return posts
+
+
+__SERIALIZERS[None] = _compile('post', PostModel, COMMON_LAYOUT)
+register('text', TextPost, {'text': 'text'})
+register('image', ImagePost, {'image': {
+    'file_id': 'file_id', 'file_size': 'file_size', 'width': 'width', 'height': 'height', 'thumbnail': _THUMBNAIL,
+    'caption': 'caption'}})
+register('video', VideoPost, {'video': {
+    'file_id': 'file_id', 'file_size': 'file_size', 'width': 'width', 'height': 'height', 'duration': 'duration',
+    'thumbnail': _THUMBNAIL, 'caption': 'caption'}})
+register('animation', AnimationPost, {'animation': {
+    'file_id': 'file_id', 'file_size': 'file_size', 'width': 'width', 'height': 'height', 'duration': 'duration',
+    'file_name': 'file_name', 'thumbnail': _THUMBNAIL, 'caption': 'caption'}})
+register('video_note', VideoNotePost, {'video_note': {
+    'file_id': 'file_id', 'file_size': 'file_size', 'length': 'length', 'duration': 'duration',
+    'thumbnail': _THUMBNAIL, 'caption': 'caption'}})
+register('voice', VoicePost, {'voice': {
+    'file_id': 'file_id', 'file_size': 'file_size', 'duration': 'duration', 'caption': 'caption'}})
+register('audio', AudioPost, {'audio': {
+    'file_id': 'file_id', 'file_size': 'file_size', 'performer': 'performer', 'duration': 'duration',
+    'title': 'title', 'thumbnail': _THUMBNAIL, 'caption': 'caption'}})
+register('document', DocumentPost, {'document': {
+    'file_id': 'file_id', 'file_size': 'file_size', 'file_name': 'file_name', 'thumbnail': _THUMBNAIL,
+    'caption': 'caption'}})
+register('location', LocationPost, {'location': {'latitude': 'latitude', 'longitude': 'longitude'}})
+register('venue', VenuePost, {'venue': {
+    'location': {'latitude': 'latitude', 'longitude': 'longitude'}, 'title': 'title', 'address': 'address',
+    'foursquare_id': 'foursquare_id', 'foursquare_type': 'foursquare_type'}})
+
+
+def unreachable_models()-> List[type]:
+    """
+    :return: The [PostModel] subclasses with no serializer of their own. Their documents would only get the fields of
+             another type, or the common ones.
+    """
+    missing, pending = [], list(PostModel.__subclasses__())
+    while pending:
+        model = pending.pop()
+        pending.extend(model.__subclasses__())
+        if model._mongometa.object_name not in __CLASS_SERIALIZERS:
+            missing.append(model)
+    return missing
+
+
+if unreachable_models():
+    raise RuntimeError('Post models with no serializer: ' + ', '.join(i.__name__ for i in unreachable_models()))
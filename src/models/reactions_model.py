@@ -21,13 +21,13 @@
 # SUCH DAMAGES.
 #
 
-from pymodm import fields, MongoModel, EmbeddedMongoModel, connect
-from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference
+from pymodm import fields, MongoModel, EmbeddedMongoModel
+from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference, ASCENDING
 from .config import *
+from .connection import connect
 from .post_models import BasePostModel as PostModel
 
-connect(f'{MONGO_URI}/posts', alias='Posts', ssl=USE_SSL,
-        username=DB_ADMIN_USERNAME, password=DB_ADMIN_PASSWORD)
+connect('posts', alias='Posts')
 
 
 class ReactionObj(EmbeddedMongoModel):
@@ -67,6 +67,8 @@ class UserReaction(MongoModel):
             IndexModel('userId', name='userReactionUserIdIndex', sparse=True),
             IndexModel('reactionIndex', name='userReactionReactionIndexIndex', sparse=True),
             IndexModel('reactionDate', name='userReactionDateIndex', sparse=True),
-            IndexModel('postId', name='postIdIndex', sparse=True)
+            IndexModel('postId', name='postIdIndex', sparse=True),
+            # A single reaction per user on each post
+            IndexModel([('userId', ASCENDING), ('postId', ASCENDING)], name='userReactionUserPostIndex', unique=True)
         ]
         ignore_unknown_fields = True
@@ -22,12 +22,12 @@
 #
 
 from pymodm import fields, MongoModel
-from pymodm.connection import connect
 from pymongo import write_concern as wc, read_concern as rc, IndexModel, ReadPreference
 from re import compile
 from .config import *
+from .connection import connect
 
-u = connect(f'{MONGO_URI}/users', alias='Users', ssl=USE_SSL, username=DB_ADMIN_USERNAME, password=DB_ADMIN_PASSWORD)
+connect('users', alias='Users')
 username_pattern = compile('[\w\d_]+')
 
 
@@ -21,6 +21,6 @@
 # SUCH DAMAGES.
 #
 
-from src.utils import security, function_handlers, json_handlers
+from src.utils import security, executors, function_handlers, json_handlers, id_allocator, cursors, ranking
 
-__all__ = ['security', 'function_handlers', 'json_handlers']
+__all__ = ['security', 'executors', 'function_handlers', 'json_handlers', 'id_allocator', 'cursors', 'ranking']
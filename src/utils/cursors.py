@@ -0,0 +1,77 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+"""
+Opaque cursors for keyset pagination. A cursor carries the sort key of the last item of a page, so the next page is a
+range query on an index, instead of skipping every item before it.
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import datetime
+import json
+
+
+__all__ = ['encode_cursor', 'decode_cursor']
+
+
+__EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        # Milliseconds, the precision stored by MongoDB
+        return {'d': (value - __EPOCH) // datetime.timedelta(milliseconds=1)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return __EPOCH + datetime.timedelta(milliseconds=value['d'])
+    return value
+
+
+def encode_cursor(*values)-> str:
+    """
+    Encodes the sort key of an item as a cursor.
+    :param values: The values of the sort key. Strings, numbers, None and naive UTC datetimes are supported
+    :return: URL safe string
+    """
+    data = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int)-> list:
+    """
+    Decodes a cursor made by `encode_cursor`.
+    :param cursor: The cursor
+    :param size: The quantity of values the cursor must have
+    :return: List of the values of the sort key. Raises ValueError if the cursor is malformed
+    """
+    try:
+        data = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = [_decode_value(value) for value in json.loads(data.decode('utf-8'))]
+    except (TypeError, KeyError, UnicodeDecodeError, ValueError, OverflowError) as exc:
+        raise ValueError('Malformed cursor.') from exc
+    if len(values) != size:
+        raise ValueError('Malformed cursor.')
+    return values
@@ -0,0 +1,210 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+"""
+Process-wide executor management. Every blocking call that needs to leave the event loop goes through one of the
+named, bounded thread pools held here, instead of each caller creating its own pool.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Union
+from threading import Lock
+import asyncio
+import os
+import time
+
+
+__all__ = ['ExecutorManager', 'executors', 'MONGO_READ', 'MONGO_WRITE', 'CPU']
+
+
+MONGO_READ = 'mongo_read'
+MONGO_WRITE = 'mongo_write'
+CPU = 'cpu'
+
+# Default size of each pool. Reads are the most common operation, so they get the biggest pool; writes are journaled
+# and slower, but less frequent. CPU work gains nothing from more threads than cores.
+DEFAULT_POOLS = {
+    MONGO_READ: 32,
+    MONGO_WRITE: 16,
+    CPU: os.cpu_count() or 4,
+}
+
+
+class _PoolStats:
+    """
+    Thread-safe counters of a single pool. Updated both from the event loop (on submit) and from the worker threads
+    (on start / finish).
+    """
+
+    __slots__ = ('lock', 'submitted', 'started', 'completed', 'failed', 'cancelled',
+                 'total_wait', 'max_wait', 'total_run')
+
+    def __init__(self):
+        self.lock = Lock()
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def on_submit(self):
+        with self.lock:
+            self.submitted += 1
+
+    def on_start(self, wait: float):
+        with self.lock:
+            self.started += 1
+            self.total_wait += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+    def on_finish(self, run: float, failed: bool):
+        with self.lock:
+            self.completed += 1
+            self.total_run += run
+            if failed:
+                self.failed += 1
+
+    def on_cancel(self):
+        with self.lock:
+            self.cancelled += 1
+
+    def snapshot(self)-> Dict[str, Union[int, float]]:
+        with self.lock:
+            queued = self.submitted - self.started - self.cancelled
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+                'queued': queued,
+                'running': self.started - self.completed,
+                'avg_wait': (self.total_wait / self.started) if self.started else 0.0,
+                'max_wait': self.max_wait,
+                'avg_run': (self.total_run / self.completed) if self.completed else 0.0,
+            }
+
+
+class ExecutorManager:
+    """
+    Holds named, sized thread pools shared by the whole process. The pools are only created when first used, so
+    importing this module has no cost.
+    """
+
+    def __init__(self, pools: Dict[str, int] = None):
+        """
+        :param pools: A dict mapping the pool names to their maximum number of workers. Defaults to [DEFAULT_POOLS]
+        """
+        self._lock = Lock()
+        self._sizes: Dict[str, int] = dict(pools if pools is not None else DEFAULT_POOLS)
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._stats: Dict[str, _PoolStats] = {name: _PoolStats() for name in self._sizes}
+
+    def configure(self, name: str, max_workers: int)-> None:
+        """
+        Adds a new pool, or resizes an existing one. Resizing a pool that is already running replaces its executor;
+        the tasks queued on the old one still run to completion.
+        :param name: The name of the pool
+        :param max_workers: The maximum number of threads of the pool
+        """
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1.')
+        with self._lock:
+            self._sizes[name] = max_workers
+            self._stats.setdefault(name, _PoolStats())
+            old = self._executors.pop(name, None)
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def executor(self, name: str)-> ThreadPoolExecutor:
+        """
+        Gets the executor of a pool, creating it if needed.
+        :param name: The name of the pool
+        :return: [ThreadPoolExecutor] of the pool. Raises KeyError if the pool was never configured.
+        """
+        executor = self._executors.get(name, None)
+        if executor is None:
+            with self._lock:
+                executor = self._executors.get(name, None)
+                if executor is None:
+                    if name not in self._sizes:
+                        raise KeyError(f'Unknown executor pool: {name}')
+                    executor = ThreadPoolExecutor(max_workers=self._sizes[name], thread_name_prefix=name)
+                    self._executors[name] = executor
+        return executor
+
+    async def run(self, name: str, func: Callable, *args, **kwargs):
+        """
+        Runs a blocking function in one of the pools, and awaits its result.
+        :param name: The name of the pool
+        :param func: The blocking function
+        :param args: Positional arguments of `func`
+        :param kwargs: Keyword arguments of `func`
+        :return: Whatever `func` returns
+        """
+        executor = self.executor(name)
+        stats = self._stats[name]
+        submitted = time.monotonic()
+
+        def job():
+            started = time.monotonic()
+            stats.on_start(started - submitted)
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                stats.on_finish(time.monotonic() - started, failed)
+
+        stats.on_submit()
+        future: Future = executor.submit(job)
+        future.add_done_callback(lambda f: stats.on_cancel() if f.cancelled() else None)
+        return await asyncio.wrap_future(future)
+
+    def stats(self, name: str = None)-> Dict:
+        """
+        Metrics of the pools: submitted, completed, failed and cancelled calls, queue depth, running calls, average and
+        maximum time waited in the queue, and average run time (both in seconds).
+        :param name: (Optional) The name of a single pool
+        :return: The metrics of the pool, or a dict mapping every pool name to its metrics
+        """
+        if name is not None:
+            return self._stats[name].snapshot()
+        return {_name: stats.snapshot() for _name, stats in self._stats.items()}
+
+    def shutdown(self, wait: bool = True)-> None:
+        """
+        Shuts every pool down. The pools are created again if used afterwards.
+        :param wait: If True, blocks until every pending call is done
+        """
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=wait)
+
+
+executors = ExecutorManager()
@@ -21,39 +21,51 @@
 # SUCH DAMAGES.
 #
 
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable
+from typing import Callable, Dict, Iterable, Union
 import asyncio
 from collections import OrderedDict
 from functools import partial, wraps
+from threading import Lock
+import sys
+import time
+from .executors import executors, MONGO_READ
 
 
-__all__ = ['to_async', 'async_lru', 'temp_lru_cache']
+__all__ = ['to_async', 'async_lru', 'temp_lru_cache', 'single_flight', 'flight_stats']
 
 
 # Inspired by https://github.com/django/asgiref/blob/master/asgiref/sync.py
 class to_async:
     """
-    A helper class to create Awaitable functions from synchronous functions.
+    A helper class to create Awaitable functions from synchronous functions. The function runs on one of the shared
+    pools of [executors], so creating a new instance per call costs nothing but the instance itself.
     """
 
-    def __init__(self, func: Callable):
+    def __init__(self, func: Callable, pool: str = MONGO_READ, *, inline: bool = False):
+        """
+        :param func: The synchronous function
+        :param pool: The name of the executor pool to run the function. Defaults to the Mongo reads pool
+        :param inline: If True, the function is called directly on the event loop. Meant for cheap calls, like building
+                       a lazy query set, where the thread handoff costs more than the call itself
+        """
         self.func = func
-        self.loop = asyncio.get_event_loop()
-        self.loop.set_default_executor(ThreadPoolExecutor())
+        self.pool = pool
+        self.inline = inline
 
     async def __call__(self, *args, **kwargs):
-        future = self.loop.run_in_executor(None, partial(self.func, *args, **kwargs))
-        return await asyncio.wait_for(future, timeout=None)
+        if self.inline:
+            return self.func(*args, **kwargs)
+        return await executors.run(self.pool, self.func, *args, **kwargs)
 
 
 # Inspired by <https://github.com/aio-libs/async_lru/blob/master/async_lru.py> and
 # <https://wiki.python.org/moin/PythonDecoratorLibrary>
 class async_lru:
     """
-    A helper class to make LRU cache of async functions
+    A helper class to make LRU cache of async functions. Every decorated function has its own cache, with its own
+    limits and counters. The decorated function also gets `cache_clear()`, `invalidate(*args, **kwargs)` and
+    `cache_info()` attributes.
     """
-    cache = OrderedDict()
 
     # Copied from functools.py
     class hashed_seq(list):
@@ -73,54 +85,111 @@ class async_lru:
         def __hash__(self):
             return self.hash_value
 
-    def __init__(self, max_size: int):
+    def __init__(self, max_size: int, *, ttl: float = None, max_bytes: int = None):
+        """
+        :param max_size: Maximum quantity of results to be kept
+        :param ttl: (Optional) Seconds a result is valid. Defaults to forever
+        :param max_bytes: (Optional) Approximate maximum memory, in bytes, the results can use
+        """
         self.maxsize = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()
         self.hits: int = 0
         self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+        self.bytes: int = 0
         self.func: Callable = None
         self.tasks: set = set()
-        self.loop = asyncio.get_event_loop()
 
     def __call__(self, func):
-        if self.func is None or (self.func != func):
-            self.func = func
+        if self.func is not None and self.func != func:
+            # The same instance can't share its cache with another function
+            return async_lru(self.maxsize, ttl=self.ttl, max_bytes=self.max_bytes)(func)
+        self.func = func
 
         @wraps(self.func)
         async def decorator(*args, **kwargs):
             key = self._make_key(args, kwargs)
 
-            future: asyncio.Task = self.cache.get(key, None)
-            if future is not None:
-                if not future.done():
+            entry = self.cache.get(key, None)
+            if entry is not None:
+                task, expires, _ = entry
+                if expires is not None and expires < time.monotonic():
+                    self.expirations += 1
+                    self._pop(key)
+                elif not task.done():
                     self.hits += 1
-                    return await asyncio.shield(future, loop=self.loop)
-                exception = future.exception()
-                if exception is None:
+                    return await asyncio.shield(task)
+                elif not task.cancelled() and task.exception() is None:
                     self.hits += 1
                     self.cache.move_to_end(key)
-                    return future.result()
-
-                # In case there happened an exception, it won't cache it.
-                self.cache.pop(key)
+                    return task.result()
+                else:
+                    # In case there happened an exception, it won't cache it.
+                    self._pop(key)
 
-            future = self.loop.create_future()
-            coro = self.func(*args, **kwargs)
-            task: asyncio.Task = asyncio.create_task(coro=coro)
-            task.add_done_callback(partial(self._done_callback, future))
+            task: asyncio.Task = asyncio.get_running_loop().create_task(self.func(*args, **kwargs))
             self.tasks.add(task)
-            task.add_done_callback(self.tasks.remove)
-
-            self.cache[key] = task
-
-            if len(self.cache) > self.maxsize:
-                self.cache.popitem(last=False)
+            task.add_done_callback(self.tasks.discard)
+            task.add_done_callback(partial(self._done_callback, key))
 
+            expires = time.monotonic() + self.ttl if self.ttl is not None else None
+            self.cache[key] = (task, expires, 0)
             self.misses += 1
-            self.cache.move_to_end(key)
+            self._evict()
+
+            return await asyncio.shield(task)
 
-            return await asyncio.shield(future, loop=self.loop)
+        decorator.cache_clear = self.cache_clear
+        decorator.invalidate = self.invalidate
+        decorator.cache_info = self.cache_info
         return decorator
 
+    def cache_clear(self)-> None:
+        """
+        Removes every cached result of the function.
+        """
+        self.cache.clear()
+        self.bytes = 0
+
+    def invalidate(self, *args, **kwargs)-> bool:
+        """
+        Removes the cached result of a single call. The arguments must be given just like in the call to be removed.
+        :return: True if there was a cached result, False otherwise
+        """
+        return self._pop(self._make_key(args, kwargs))
+
+    def cache_info(self)-> dict:
+        """
+        :return: Dict with the counters of the cache
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'max_size': self.maxsize,
+            'size': len(self.cache),
+            'max_bytes': self.max_bytes,
+            'bytes': self.bytes,
+        }
+
+    def _pop(self, key)-> bool:
+        entry = self.cache.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[2]
+        return True
+
+    def _evict(self)-> None:
+        while len(self.cache) > self.maxsize or \
+                (self.max_bytes is not None and self.bytes > self.max_bytes and len(self.cache) > 1):
+            _, entry = self.cache.popitem(last=False)
+            self.bytes -= entry[2]
+            self.evictions += 1
+
     # Copied from functools.py
     def _make_key(self, args, kwargs, typed=True,):
         """Make a cache key from optionally typed positional and keyword arguments
@@ -154,18 +223,17 @@ class async_lru:
             return key[0]
         return self.hashed_seq(key)
 
-    @staticmethod
-    def _done_callback(future: asyncio.Future, task: asyncio.Task):
-        if task.cancelled():
-            future.cancel()
+    def _done_callback(self, key, task: asyncio.Task):
+        entry = self.cache.get(key, None)
+        if entry is None or entry[0] is not task:
             return
-
-        exception = task.exception()
-        if exception is not None:
-            future.set_exception(exception)
+        if task.cancelled() or task.exception() is not None:
+            self._pop(key)
             return
-
-        future.set_result(task.result())
+        size = approximate_size(task.result())
+        self.cache[key] = (task, entry[1], size)
+        self.bytes += size
+        self._evict()
 
     def __repr__(self):
         return self.func.__doc__
@@ -174,34 +242,206 @@ class async_lru:
         return partial(self.__call__, instance)
 
 
+def approximate_size(obj, depth: int = 2)-> int:
+    """
+    Approximate memory used by an object, following the items of containers up to `depth` levels.
+    :param obj: Any Python object
+    :param depth: How deep to follow containers
+    :return: Size in bytes
+    """
+    size = sys.getsizeof(obj)
+    if depth > 0:
+        if isinstance(obj, dict):
+            size += sum(approximate_size(k, depth - 1) + approximate_size(v, depth - 1) for k, v in obj.items())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            size += sum(approximate_size(i, depth - 1) for i in obj)
+        elif hasattr(obj, '__dict__'):
+            size += approximate_size(vars(obj), depth - 1)
+    return size
+
+
+class _cache_shard:
+    """
+    A single shard of a [temp_lru_cache]: an LRU dict guarded by its own lock.
+    """
+
+    __slots__ = ('lock', 'data', 'max_size', 'hits', 'misses', 'evictions', 'expirations')
+
+    def __init__(self, max_size: int):
+        self.lock = Lock()
+        self.data = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, now: float):
+        entry = self.data.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires = entry
+        if expires is not None and expires < now:
+            del self.data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, expires):
+        if key in self.data:
+            self.data.move_to_end(key)
+        self.data[key] = (value, expires)
+        if len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+
 class temp_lru_cache:
     """
     A temporary, multi utility LRU Cache class to cache information temporarily in dicts.
     Different from the lru_cache decorators, this class is instantiated and is not meant to be used to cache
     function results to avoid extensive workloads; instead is served to cache dynamic information, like
     I/O info that can change overtime.
+
+    Every instance has its own storage, split in `shards` LRU dicts, each one with its own lock, so concurrent
+    accesses to different keys don't wait for each other. Items expire after `ttl` seconds.
     """
-    _data = OrderedDict()
 
-    def __init__(self, max_size: int):
-        self.max_size = max_size
+    def __init__(self, max_size: int, ttl: float = None, shards: int = 16):
+        """
+        :param max_size: Maximum quantity of items in the cache, spread evenly among the shards
+        :param ttl: (Optional) Default time to live of the items, in seconds. Defaults to forever
+        :param shards: Quantity of shards to split the cache into
+        """
+        shards = max(1, min(shards, max_size))
+        shard_size = -(-max_size // shards)
+        object.__setattr__(self, 'max_size', max_size)
+        object.__setattr__(self, 'ttl', ttl)
+        object.__setattr__(self, '_shards', tuple(_cache_shard(shard_size) for _ in range(shards)))
+
+    def _shard(self, key)-> _cache_shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _expires(self, ttl: Union[float, None])-> Union[float, None]:
+        ttl = ttl if ttl is not None else self.ttl
+        return time.monotonic() + ttl if ttl is not None else None
+
+    def get(self, key, default=None):
+        """
+        Gets an item from the cache.
+        :param key: The key of the item
+        :param default: Returned if the item is not cached, or has expired
+        :return: The cached item, or `default`
+        """
+        shard = self._shard(key)
+        with shard.lock:
+            item = shard.get(key, time.monotonic())
+        return item if item is not None else default
+
+    def set(self, key, value, ttl: float = None)-> None:
+        """
+        Caches an item.
+        :param key: The key of the item
+        :param value: The item
+        :param ttl: (Optional) Time to live of this item, in seconds. Defaults to the cache ttl
+        """
+        expires = self._expires(ttl)
+        shard = self._shard(key)
+        with shard.lock:
+            shard.set(key, value, expires)
+
+    def get_many(self, keys: Iterable)-> dict:
+        """
+        Gets many items at once, locking each shard only once.
+        :param keys: The keys of the items
+        :return: Dict with the cached items. Keys that are not cached are not in the dict
+        """
+        by_shard: Dict[int, list] = {}
+        for key in keys:
+            by_shard.setdefault(hash(key) % len(self._shards), []).append(key)
+        now = time.monotonic()
+        result = {}
+        for index, _keys in by_shard.items():
+            shard = self._shards[index]
+            with shard.lock:
+                for key in _keys:
+                    item = shard.get(key, now)
+                    if item is not None:
+                        result[key] = item
+        return result
+
+    def set_many(self, items: dict, ttl: float = None)-> None:
+        """
+        Caches many items at once, locking each shard only once.
+        :param items: Dict mapping the keys to the items
+        :param ttl: (Optional) Time to live of these items, in seconds. Defaults to the cache ttl
+        """
+        expires = self._expires(ttl)
+        by_shard: Dict[int, list] = {}
+        for key, value in items.items():
+            by_shard.setdefault(hash(key) % len(self._shards), []).append((key, value))
+        for index, _items in by_shard.items():
+            shard = self._shards[index]
+            with shard.lock:
+                for key, value in _items:
+                    shard.set(key, value, expires)
+
+    def pop(self, key, default=None):
+        """
+        Removes an item from the cache.
+        :param key: The key of the item
+        :param default: Returned if the item is not cached
+        :return: The removed item, or `default`
+        """
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self)-> None:
+        """
+        Removes every item from the cache.
+        """
+        for shard in self._shards:
+            with shard.lock:
+                shard.data.clear()
+
+    def stats(self)-> dict:
+        """
+        :return: Dict with the counters of the cache, summed over all the shards
+        """
+        result = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'size': 0}
+        for shard in self._shards:
+            with shard.lock:
+                result['hits'] += shard.hits
+                result['misses'] += shard.misses
+                result['evictions'] += shard.evictions
+                result['expirations'] += shard.expirations
+                result['size'] += len(shard.data)
+        lookups = result['hits'] + result['misses']
+        result['hit_ratio'] = result['hits'] / lookups if lookups else 0.0
+        result['max_size'] = self.max_size
+        result['shards'] = len(self._shards)
+        return result
+
+    def __len__(self):
+        return sum(len(shard.data) for shard in self._shards)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
 
     def __getitem__(self, key):
-        item = self._data.get(key, None)
-        if item is not None:
-            self._data.move_to_end(key)
-        return item
+        return self.get(key)
 
     def __setitem__(self, key, value):
-        if key in self._data:
-            self._data.move_to_end(key)
-        self._data[key] = value
-        if len(self._data) > self.max_size:
-            self._data.popitem(last=False)
+        self.set(key, value)
 
     def __delitem__(self, key):
-        if key in self._data:
-            del self._data[key]
+        self.pop(key)
 
     def __getattr__(self, item):
         return self.__getitem__(item)
@@ -211,3 +451,69 @@ class temp_lru_cache:
 
     def __delattr__(self, item):
         return self.__delitem__(item)
+
+
+# Named [single_flight] instances, for `flight_stats`. Single underscore: the name is used within the class.
+_FLIGHTS: Dict[str, 'single_flight'] = {}
+
+
+class single_flight:
+    """
+    Coalesces concurrent calls for the same key: while a call for a key is in flight, any other call for that key
+    waits for, and shares, its result (or exception) instead of doing the same work again.
+    """
+
+    def __init__(self, name: str = None):
+        """
+        :param name: (Optional) Name the statistics of this instance are reported by, on `flight_stats`
+        """
+        self._calls: Dict[object, asyncio.Task] = {}
+        self.calls: int = 0
+        self.merged: int = 0
+        if name is not None:
+            _FLIGHTS[name] = self
+
+    async def do(self, key, func: Callable, *args, **kwargs):
+        """
+        Awaits `func(*args, **kwargs)`, unless there is already a call in flight for `key`.
+        :param key: Identifies the call. Calls with the same key must return the same result
+        :param func: A coroutine function, or any callable returning an awaitable
+        :param args: Positional arguments of `func`
+        :param kwargs: Keyword arguments of `func`
+        :return: The result of the call
+        """
+        self.calls += 1
+        task = self._calls.get(key, None)
+        if task is not None:
+            self.merged += 1
+        else:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(partial(self._done_callback, key))
+        # The shield keeps a cancelled caller from cancelling the call shared with the others.
+        return await asyncio.shield(task)
+
+    def _done_callback(self, key, task: asyncio.Task):
+        if self._calls.get(key, None) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Marks the exception as retrieved, in case every caller was cancelled
+            task.exception()
+
+    def stats(self)-> dict:
+        """
+        :return: Dict with the total calls, how many of them were merged into an in-flight call, and the calls in flight
+        """
+        return {
+            'calls': self.calls,
+            'merged': self.merged,
+            'in_flight': len(self._calls),
+        }
+
+
+def flight_stats()-> Dict[str, dict]:
+    """
+    Metrics of every named [single_flight]: total calls, calls merged into an in-flight call, and calls in flight.
+    :return: Dict mapping the name of each instance to its `stats`
+    """
+    return {name: flight.stats() for name, flight in _FLIGHTS.items()}
@@ -0,0 +1,109 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+"""
+Local allocation of unique, time-sortable IDs. IDs are made in memory, without reaching the database, and IDs made
+later sort after IDs made earlier, so indexes on them only grow at the end.
+"""
+
+from threading import Lock
+import datetime
+import random
+import time
+
+
+__all__ = ['IdAllocator', 'ids']
+
+
+class IdAllocator:
+    """
+    Issues 63 bits IDs made of the milliseconds since `EPOCH`, the ID of the worker, and a sequence within the
+    millisecond, written as 16 hex digits. IDs are unique as long as no two running workers share a worker ID; without
+    a reserved one, a random worker ID is used.
+    """
+
+    # 2018-01-01T00:00:00Z, in milliseconds
+    EPOCH = 1514764800000
+    TIME_BITS = 41
+    WORKER_BITS = 10
+    SEQUENCE_BITS = 12
+
+    def __init__(self, worker_id: int = None):
+        """
+        :param worker_id: (Optional) ID of this worker, from 0 to 2 ** `WORKER_BITS` - 1. Random if not given
+        """
+        self._lock = Lock()
+        self._last = 0
+        self._sequence = 0
+        self._worker_id = 0
+        self.worker_id = worker_id if worker_id is not None else random.getrandbits(self.WORKER_BITS)
+
+    @property
+    def worker_id(self)-> int:
+        return self._worker_id
+
+    @worker_id.setter
+    def worker_id(self, worker_id: int):
+        if not 0 <= worker_id < 1 << self.WORKER_BITS:
+            raise ValueError(f'worker_id must be between 0 and {(1 << self.WORKER_BITS) - 1}')
+        with self._lock:
+            self._worker_id = worker_id
+
+    def next_int(self)-> int:
+        """
+        :return: A new ID, as an integer
+        """
+        with self._lock:
+            now = int(time.time() * 1000) - self.EPOCH
+            if now > self._last:
+                self._last = now
+                self._sequence = 0
+            else:
+                # Same millisecond, or the clock went back: keeps counting from the last millisecond used, and borrows
+                # the next one once its sequence runs out.
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    self._last += 1
+            return ((self._last << (self.WORKER_BITS + self.SEQUENCE_BITS)) |
+                    (self._worker_id << self.SEQUENCE_BITS) |
+                    self._sequence)
+
+    def next_id(self)-> str:
+        """
+        :return: A new ID, as 16 hex digits
+        """
+        return format(self.next_int(), '016x')
+
+    @classmethod
+    def created_date(cls, _id: str)-> datetime.datetime:
+        """
+        Gets the time an ID was issued.
+        :param _id: An ID issued by `next_id`
+        :return: UTC datetime, with millisecond precision
+        """
+        milliseconds = (int(_id[:16], 16) >> (cls.WORKER_BITS + cls.SEQUENCE_BITS)) + cls.EPOCH
+        return datetime.datetime.utcfromtimestamp(milliseconds / 1000)
+
+
+# Allocator shared by the whole process
+ids = IdAllocator()
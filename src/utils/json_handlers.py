@@ -33,7 +33,7 @@ async def encode(*args, **kwargs)-> Union[Awaitable, str]:
     :param kwargs:
     :return: An awaitable encoding
     """
-    encoder = to_async(ujson.dumps)
+    encoder = to_async(ujson.dumps, inline=True)
     return await encoder(*args, **kwargs)
 
 
@@ -44,7 +44,7 @@ async def decode(*args, **kwargs)-> Union[Awaitable, dict]:
     :param kwargs:
     :return: An awaitable decoding
     """
-    decoder = to_async(ujson.loads)
+    decoder = to_async(ujson.loads, inline=True)
     return await decoder(*args, **kwargs)
 
 
@@ -66,7 +66,7 @@ class SuperDict(dict):
             elif isinstance(v, list):
                 if rcall < 5:
                     _ = rcall + 1
-                    v = [SuperDict(i, _) for i in v]
+                    v = [SuperDict(i, _) if isinstance(i, dict) else i for i in v]
             self[k] = v
 
     def __getattr__(self, item):
@@ -0,0 +1,111 @@
+#
+# Copyright (C) Halk-lai Liff <halkliff@pm.me> & Werberth Lins <werberth.lins@gmail.com>, 2018-present
+# Distributed under GNU AGPLv3 License, found at the root tree of this source, by the name of LICENSE
+# You can also find a copy of this license at GNU's site, as it follows <https://www.gnu.org/licenses/agpl-3.0.en.html>
+#
+# THIS SOFTWARE IS PRESENTED AS-IS, WITHOUT ANY WARRANTY, OR LIABILITY FROM ITS AUTHORS
+# EITHER EXPRESSED OR IMPLIED, INCLUDING, BUT NOT LIMITED TO,
+# THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE.  THE ENTIRE RISK AS TO THE QUALITY AND PERFORMANCE OF THE PROGRAM
+# IS WITH YOU.  SHOULD THE PROGRAM PROVE DEFECTIVE, YOU ASSUME THE COST OF
+# ALL NECESSARY SERVICING, REPAIR OR CORRECTION.
+#
+# IN NO EVENT UNLESS REQUIRED BY APPLICABLE LAW OR AGREED TO IN WRITING
+# WILL ANY COPYRIGHT HOLDER, OR ANY OTHER PARTY WHO MODIFIES AND/OR CONVEYS
+# THE PROGRAM AS PERMITTED ABOVE, BE LIABLE TO YOU FOR DAMAGES, INCLUDING ANY
+# GENERAL, SPECIAL, INCIDENTAL OR CONSEQUENTIAL DAMAGES ARISING OUT OF THE
+# USE OR INABILITY TO USE THE PROGRAM (INCLUDING BUT NOT LIMITED TO LOSS OF
+# DATA OR DATA BEING RENDERED INACCURATE OR LOSSES SUSTAINED BY YOU OR THIRD
+# PARTIES OR A FAILURE OF THE PROGRAM TO OPERATE WITH ANY OTHER PROGRAMS),
+# EVEN IF SUCH HOLDER OR OTHER PARTY HAS BEEN ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+
+"""
+Wilson Score Interval, to calculate the ranking of comments. The algorithm can be seen implemented on reddit, as
+followed: https://github.com/reddit-archive/reddit/blob/master/r2/r2/lib/db/_sorts.pyx
+The explanation of the Wilson Score Interval can be found here:
+http://www.evanmiller.org/how-not-to-sort-by-average-rating.html
+
+Scores are the lower bound of the interval times 100. Votes are scored by the database, within the update that counts
+them, through `confidence_expression`; `confidence_many` scores comments in bulk, when they are re-ranked.
+"""
+
+from ..models.config import COMMENT_RANK_Z
+from math import sqrt
+from typing import List, Sequence, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = ['confidence', 'confidence_many', 'confidence_expression']
+
+
+def confidence(ups: int, downs: int, z: float = COMMENT_RANK_Z)-> float:
+    """
+    Calculates the score of a comment, with the closed form of the Wilson Score Interval.
+    :param ups: Quantity of up ranks
+    :param downs: Quantity of down ranks
+    :param z: The quantile of the confidence level
+    :return: The score, from 0 to 100
+    """
+    n = ups + downs
+    if n <= 0:
+        return 0.0
+
+    p = float(ups) / n
+    left = p + 1/(2*n)*z*z
+    right = z*sqrt(p*(1-p)/n + z*z/(4*n*n))
+    under = 1+1/n*z*z
+    return (left - right) / under * 100
+
+
+def confidence_many(ups: Sequence[int], downs: Sequence[int], z: float = COMMENT_RANK_Z)-> List[float]:
+    """
+    Calculates the scores of many comments at once. Vectorized with NumPy if it is installed.
+    :param ups: Quantities of up ranks
+    :param downs: Quantities of down ranks, in the same order
+    :param z: The quantile of the confidence level
+    :return: List of the scores, in the same order
+    """
+    if numpy is None:
+        return [confidence(u, d, z) for u, d in zip(ups, downs)]
+
+    ups = numpy.asarray(ups, dtype=numpy.float64)
+    n = ups + numpy.asarray(downs, dtype=numpy.float64)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        p = ups / n
+        left = p + z*z/(2*n)
+        right = z*numpy.sqrt(p*(1-p)/n + z*z/(4*n*n))
+        under = 1 + z*z/n
+        scores = numpy.where(n > 0, (left - right) / under * 100, 0.0)
+    return scores.tolist()
+
+
+def confidence_expression(ups: Union[str, dict], downs: Union[str, dict], z: float = COMMENT_RANK_Z)-> dict:
+    """
+    The score of `confidence`, as an aggregation expression, so it can be calculated by the database within an update.
+    :param ups: Expression of the quantity of up ranks, like '$rank.upCount'
+    :param downs: Expression of the quantity of down ranks
+    :param z: The quantile of the confidence level
+    :return: The aggregation expression
+    """
+    return {'$let': {
+        'vars': {'n': {'$add': [ups, downs]}},
+        'in': {'$cond': [{'$lte': ['$$n', 0]}, 0.0, {'$let': {
+            'vars': {'p': {'$divide': [ups, '$$n']}},
+            'in': {'$multiply': [100, {'$divide': [
+                {'$subtract': [
+                    {'$add': ['$$p', {'$divide': [z*z, {'$multiply': [2, '$$n']}]}]},
+                    {'$multiply': [z, {'$sqrt': {'$add': [
+                        {'$divide': [{'$multiply': ['$$p', {'$subtract': [1, '$$p']}]}, '$$n']},
+                        {'$divide': [z*z, {'$multiply': [4, '$$n', '$$n']}]},
+                    ]}}]},
+                ]},
+                {'$add': [1, {'$divide': [z*z, '$$n']}]},
+            ]}]},
+        }}]},
+    }}